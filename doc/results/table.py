@@ -1,23 +1,36 @@
-import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from tabulate import tabulate
 
+try:
+    from orjson import loads
+except ImportError:  # orjson is optional, fall back to the standard library parser
+    from json import loads
+
 dataset_ids = [f"i{x}0" for x in range(2, 7)]
 improvers = ["LocalSearchImprover", "SimulatedAnnealingImprover", "ALNSWrapper"]
-results = []
-
-for dataset_id in dataset_ids:
-    for improver in improvers:
-        iter_filepath = Path(f"doc/results/{dataset_id}/{improver}_iter.json")
-        with iter_filepath.open("r", encoding="utf-8") as f:
-            iters = json.load(f)
-        keys = ["iteration", "best_value"]
-        last_iter = {
-            "dataset_id": dataset_id,
-            "improver": improver,
-            **{key: iters[-1][key] for key in keys},
-        }
-        results.append(last_iter)
+keys = ["iteration", "best_value"]
+runs = [(dataset_id, improver) for dataset_id in dataset_ids for improver in improvers]
+
+
+def load_last_iter(dataset_id: str, improver: str) -> dict:
+    """Load the last iteration recorded for the improver on the dataset."""
+    iter_filepath = Path(f"doc/results/{dataset_id}/{improver}_iter.json")
+    return loads(iter_filepath.read_bytes())[-1]
+
+
+# read and parse the files concurrently, the work is mostly I/O
+with ThreadPoolExecutor() as executor:
+    last_iters = list(executor.map(load_last_iter, *zip(*runs)))
+
+results = [
+    {
+        "dataset_id": dataset_id,
+        "improver": improver,
+        **{key: last_iter[key] for key in keys},
+    }
+    for (dataset_id, improver), last_iter in zip(runs, last_iters)
+]
 
 print(tabulate(results, headers="keys", tablefmt="github", floatfmt=".2f"))
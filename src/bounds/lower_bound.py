@@ -1,7 +1,12 @@
+import numpy as np
+from scipy.sparse.csgraph import minimum_spanning_tree
+
 from datastore.distance_manager import EuclidianDistanceManager
 from datastore.node_manager import NodeManager
 from utils.logger import Logger
 
+MIN_TREE_NODES = 2
+
 
 class LowerBoundCalculator:
     """Class to calculate lower bounds for VRP solutions."""
@@ -19,12 +24,9 @@ class LowerBoundCalculator:
         ) -> float:
         """Calculate a lower bound for the VRP solution.
 
-        The lower bound is calculated as $L * min(d_ij) + min(d_ij) * n$,
-        i.e., $min(d_ij) * n * ( max(d_ij) + 1 )$
-        where:
-            L = max(d_ij) * n, where max(d_ij) is the maximum distance in the entire distance matrix,
-            min_distance is the minimum distance between any two nodes,
-            and n is the total number of nodes including depots.
+        The lower bound is the weight of a minimum spanning tree over all nodes.
+        A route is a Hamiltonian path from node 0 to node n+1, i.e. a spanning tree,
+        so its total distance D is at least the MST weight, and L·Δ is non-negative.
 
         Args:
             node_manager (NodeManager): The manager containing all nodes.
@@ -34,21 +36,17 @@ class LowerBoundCalculator:
             float: The calculated lower bound.
 
         """
-        node_ids = [int(x) for x in node_manager.all_node_ids()]
-        n = len(node_ids)
-        max_distance = 0.0  # Initialize max distance
-        min_distance = float("inf")  # Initialize min distance
-        for i in range(n):
-            for j in range(i + 1, n):
-                node1 = node_manager.get_node(node_ids[i])
-                node2 = node_manager.get_node(node_ids[j])
-                if node1 and node2:
-                    distance = distance_manager.get_distance(node1, node2)
-                    min_distance = min(min_distance, distance)  # Update min distance
-                    max_distance = max(max_distance, distance)  # Update max distance
-        self.logger.debug(f"Minimum distance between any two nodes: {min_distance}")
-        self.logger.debug(f"Maximum distance between any two nodes: {max_distance}")
-        self.logger.debug(f"Total number of nodes (n): {n}")
-        lower_bound = min_distance * n * (max_distance + 1)
-        self.logger.debug(f"Calculated lower bound: {lower_bound}")
+        if distance_manager.distance_matrix is None:
+            distance_manager.precompute(node_manager.coords, node_manager.iids)
+        distance_matrix = distance_manager.matrix()
+        n = distance_matrix.shape[0]
+        if n < MIN_TREE_NODES:
+            return 0.0
+        # csgraph treats zero entries as missing edges, but coincident nodes are at distance zero:
+        # shift every edge by one, which leaves the spanning tree unchanged, and sum the original distances
+        shifted = distance_matrix.astype(np.float64) + 1.0
+        np.fill_diagonal(shifted, 0.0)
+        rows, cols = minimum_spanning_tree(shifted).nonzero()
+        lower_bound = float(distance_matrix[rows, cols].sum(dtype=np.float64))
+        self.logger.debug("Calculated lower bound: %s", lower_bound)
         return lower_bound
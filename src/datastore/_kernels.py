@@ -0,0 +1,37 @@
+import numpy as np
+from numba import njit, prange
+
+
+@njit(cache=True, parallel=True)
+def pairwise_min_max(distance_matrix: np.ndarray) -> tuple[float, float]:
+    """Get the minimum and maximum distance between any two distinct nodes of a symmetric distance matrix.
+
+    Rows of the upper triangle are scanned in parallel, each into its own slot, and reduced at the end.
+    """
+    n = distance_matrix.shape[0]
+    if n == 0:
+        return np.inf, 0.0
+    row_min = np.full(n, np.inf)
+    row_max = np.zeros(n)
+    for i in prange(n):
+        for j in range(i + 1, n):
+            distance = distance_matrix[i, j]
+            row_min[i] = min(row_min[i], distance)
+            row_max[i] = max(row_max[i], distance)
+    return row_min.min(), row_max.max()
+
+
+@njit(cache=True)
+def _eucl(x1: float, y1: float, x2: float, y2: float) -> float:
+    """Get the Euclidian distance between two points."""
+    return ((x1 - x2) ** 2 + (y1 - y2) ** 2) ** 0.5
+
+
+@njit(cache=True)
+def distance_many(xys_a: np.ndarray, xys_b: np.ndarray) -> np.ndarray:
+    """Get the Euclidian distance between each pair of rows of the (n, 2) coordinates, unrounded."""
+    n = xys_a.shape[0]
+    distances = np.empty(n)
+    for k in range(n):
+        distances[k] = _eucl(xys_a[k, 0], xys_a[k, 1], xys_b[k, 0], xys_b[k, 1])
+    return distances
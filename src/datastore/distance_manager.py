@@ -1,23 +1,112 @@
+import numpy as np
+
+from datastore._kernels import distance_many, pairwise_min_max
 from schemas.node import Node
 from utils.logger import Logger
 
 
+def _round_distances(diff: np.ndarray, precition_digits: int) -> list[float]:
+    """Round the distances of the (n, 2) coordinate differences exactly as `calculate_distance` does.
+
+    `round` rounds the decimal value of the distance itself, where np.round rounds the scaled distance
+    half to even, so the two disagree on distances at or next to a rounding tie.
+    """
+    return [round((dx ** 2 + dy ** 2) ** 0.5, precition_digits) for dx, dy in diff.tolist()]
+
+
 class EuclidianDistanceManager:
     """A manager for calculating Euclidian distances between nodes."""
 
     logger: Logger
     distances: dict[tuple[int, int], float]
+    distance_matrix: np.ndarray | None
+    dtype: np.dtype
+    l_value: float | None
+    _summary_stats: tuple[float, float, int] | None
 
     def __init__(
             self,
             nb_of_nodes: int,
             logger: Logger | None = None,
+            dtype: str | type = np.float64,
         ) -> None:
-        """Initialize the distance manager."""
+        """Initialize the distance manager.
+
+        The precomputed distance matrix is stored as `dtype`. float32 halves its memory and the bandwidth
+        of every gather on large instances, but L·Δ amplifies the float32 representation error of the
+        distances, so objective values are no longer exact and ties between routes may break differently.
+        """
         self.logger = logger or Logger(__name__)
+        self.dtype = np.dtype(dtype)
         self.distances = {
             (nb_of_nodes - 1, 0): 0.0,  # distance from last node to depot is zero
         }
+        self.distance_matrix = None
+        self.l_value = None
+        self._summary_stats = None
+
+    def __deepcopy__(self, memo: dict) -> "EuclidianDistanceManager":
+        """Share the manager, and its precomputed matrix, between deep copies of solution states."""
+        return self
+
+    def precompute(self, coords: np.ndarray, ids: np.ndarray) -> np.ndarray:
+        """Precompute the distance matrix of all nodes once, indexed by node id.
+
+        Args:
+            coords: The (n, 2) coordinates of the nodes
+            ids: The IDs of the nodes, in the same order as coords
+
+        Assumes node IDs are the contiguous integers 0..n-1.
+        """
+        ids = np.asarray(ids)
+        order = np.argsort(ids, kind="stable")
+        if not np.array_equal(ids[order], np.arange(len(ids))):
+            msg = "Node IDs must be the contiguous integers 0..n-1 to precompute the distance matrix"
+            raise ValueError(msg)
+        self.distance_matrix = self.calculate_distance_matrix(coords[order])
+        self._summary_stats = None
+        _, max_distance, n = self.summary_stats()  # in float64, before the matrix is stored as dtype
+        # L = max(d_ij) * n, where n excludes the start (0) and end (n+1) depot
+        self.l_value = max_distance * (n - 2)
+        self.distance_matrix = self.distance_matrix.astype(self.dtype, copy=False)
+        self.logger.debug("Precomputed distance matrix for %s nodes, L=%s", len(ids), self.l_value)
+        return self.distance_matrix
+
+    def summary_stats(self) -> tuple[float, float, int]:
+        """Get the minimum and maximum distance between any two distinct nodes, and the number of nodes.
+
+        Computed in a single parallel pass over the precomputed distance matrix and cached until the next `precompute`.
+        """
+        if self._summary_stats is None:
+            min_distance, max_distance = pairwise_min_max(self.matrix())
+            self._summary_stats = (float(min_distance), float(max_distance), self.distance_matrix.shape[0])
+        return self._summary_stats
+
+    def matrix(self) -> np.ndarray:
+        """Get the precomputed distance matrix, indexed by `index_of` the node IDs."""
+        if self.distance_matrix is None:
+            msg = "Distance matrix is not precomputed, call precompute() first"
+            raise ValueError(msg)
+        return self.distance_matrix
+
+    def index_of(self, node_id: int) -> int:
+        """Get the row and column of a node in the precomputed distance matrix.
+
+        Node IDs are the contiguous integers 0..n-1 and rows are sorted by ID, so this is the ID itself.
+        """
+        n = self.matrix().shape[0]
+        if not 0 <= node_id < n:
+            msg = f"Node ID {node_id} is not in the distance matrix of {n} nodes"
+            raise KeyError(msg)
+        return int(node_id)
+
+    def matrix_for(self, ids: np.ndarray) -> np.ndarray:
+        """Get the distance matrix between the nodes of a sequence, indexed by position in the sequence.
+
+        Args:
+            ids: The node IDs of the sequence
+        """
+        return self.matrix()[np.ix_(ids, ids)]
 
     def get_distance(
             self,
@@ -28,6 +117,8 @@ class EuclidianDistanceManager:
 
         Assumes undirected distances (distance from A to B is the same as from B to A).
         """
+        if self.distance_matrix is not None:
+            return float(self.distance_matrix[node1.id, node2.id])
 
         min_id = min(node1.id, node2.id)
         if min_id == node1.id:
@@ -40,7 +131,7 @@ class EuclidianDistanceManager:
         if key not in self.distances:
             distance = self.calculate_distance(node_min_id, node_max_id)
             self.distances[key] = distance
-            self.logger.debug(f"Calculated distance between {node1.id} and {node2.id}: {distance}")
+            self.logger.debug("Calculated distance between %s and %s: %s", node1.id, node2.id, distance)
         return self.distances[key]
 
     @staticmethod
@@ -54,3 +145,64 @@ class EuclidianDistanceManager:
             return 0.0
         distance = ((node1.x - node2.x) ** 2 + (node1.y - node2.y) ** 2) ** 0.5
         return round(distance, precition_digits)
+
+    @staticmethod
+    def calculate_distances(
+            xys_a: np.ndarray,
+            xys_b: np.ndarray,
+            precition_digits: int = 1,
+        ) -> np.ndarray:
+        """Calculate the Euclidian distance between each pair of rows of the (n, 2) coordinates.
+
+        Equal to a `calculate_distance` call per pair, in a single compiled pass; only the pairs whose
+        distance may sit on a rounding tie are rounded per pair.
+        """
+        xys_a = np.ascontiguousarray(xys_a, dtype=np.float64).reshape(-1, 2)
+        xys_b = np.ascontiguousarray(xys_b, dtype=np.float64).reshape(-1, 2)
+        distances = distance_many(xys_a, xys_b)
+        scaled = distances * 10.0 ** precition_digits
+        k = np.nonzero(np.abs(scaled - np.floor(scaled) - 0.5) <= 4 * np.finfo(np.float64).eps * scaled)[0]
+        rounded = np.round(distances, precition_digits)
+        rounded[k] = _round_distances(xys_a[k] - xys_b[k], precition_digits)
+        return rounded
+
+    @staticmethod
+    def calculate_distance_matrix(
+            coords: np.ndarray,
+            precition_digits: int = 1,
+        ) -> np.ndarray:
+        """Calculate the pairwise Euclidian distance matrix of the (n, 2) coordinates.
+
+        The squared distances are expanded so that the bulk of the work is a single BLAS matrix product,
+        without the (n, n, 2) temporary of a broadcast difference.
+
+        Row and column `k` correspond to `coords[k]`.
+        """
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        centred = coords - coords.mean(axis=0)  # smaller norms, less cancellation
+        # |a - b|² = |a|² + |b|² - 2·a·b, with the cross terms as one matrix product
+        squared_norms = np.einsum("ij,ij->i", centred, centred)
+        norms_sum = np.add.outer(squared_norms, squared_norms)
+        distances = centred @ centred.T
+        distances *= -2.0
+        distances += norms_sum
+        np.maximum(distances, 0.0, out=distances)  # clip round-off below zero
+        np.sqrt(distances, out=distances)
+
+        # The expansion is accurate to a few ulps of the squared norms only, so the pairs whose
+        # distance may sit on a rounding tie are recomputed exactly from the coordinate difference
+        scale = 10.0 ** precition_digits
+        scaled = distances * scale
+        tie_gap = np.floor(scaled)
+        np.subtract(scaled, tie_gap, out=tie_gap)
+        tie_gap -= 0.5
+        np.abs(tie_gap, out=tie_gap)
+        tie_gap *= distances
+        norms_sum *= 4 * np.finfo(np.float64).eps * scale  # bound on the error of the scaled distance
+        i, j = np.nonzero(tie_gap <= norms_sum)
+
+        # Away from a tie, rounding the scaled distances agrees with `calculate_distance`
+        np.rint(scaled, out=scaled)
+        scaled /= scale
+        scaled[i, j] = _round_distances(coords[i] - coords[j], precition_digits)
+        return scaled
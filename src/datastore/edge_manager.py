@@ -1,3 +1,7 @@
+from itertools import compress
+
+import numpy as np
+
 from schemas.node import Node
 from utils.logger import Logger
 from datastore.distance_manager import EuclidianDistanceManager
@@ -14,6 +18,7 @@ class EdgeManager:
     edges: dict[tuple[str, str], bool] = {}
     respect_even_to_odd_travel_constraint: bool
     respect_odd_to_even_travel_constraint: bool
+    valid_edges: np.ndarray | None
 
     def __init__(
             self,
@@ -27,38 +32,46 @@ class EdgeManager:
         self.nodes = {}
         self.respect_even_to_odd_travel_constraint = respect_even_to_odd_travel_constraint
         self.respect_odd_to_even_travel_constraint = respect_odd_to_even_travel_constraint
+        self.valid_edges = None
 
     def add_node(self, node: Node) -> None:
         """Add a Node to the manager."""
         self.nodes[node.id] = node
+        self.valid_edges = None  # n has changed, rebuild on next use
 
-    def is_edge_valid(self, node_from: Node, node_to: Node) -> bool:
-        """Check if an edge between two nodes is valid."""
-        if node_from.id == 0 or node_to.id == 0:
-            return True  # Allow leaving depot, and finishing at last node
-        if node_from.id == len(self.nodes) - 1:
-            return node_to.id == 0  # Allow return to depot only from last node
+    def build_validity_matrix(self) -> np.ndarray:
+        """Precompute the validity of every edge as a boolean matrix indexed by node IDs.
+
+        Assumes node IDs are the contiguous integers 0..n-1.
+        """
+        n = len(self.nodes)
+        if sorted(self.nodes) != list(range(n)):
+            msg = "Node IDs must be the contiguous integers 0..n-1 to build the validity matrix"
+            raise ValueError(msg)
+        i = np.arange(n)[:, None]
+        j = np.arange(n)[None, :]
+        invalid_edges = np.zeros((n, n), dtype=bool)
         if self.respect_even_to_odd_travel_constraint:
-            n = len(self.nodes)
             # traveling form node $𝑖 ∈ 𝑁  \ {0, 𝑛 + 1}$ to node $𝑗 ∈ 𝑁 \ {0, 𝑛 + 1}$ is forbidden
             # when: (i) $𝑖$ is an even number, (ii) $𝑗$ is an odd number, and (iii) $𝑖 < 𝑛/2$, and
-            if (
-                int(node_from.id) % 2 == 0 and
-                int(node_to.id) % 2 == 1 and
-                int(node_from.id) < n / 2
-            ):
-                return False
+            invalid_edges |= (i % 2 == 0) & (j % 2 == 1) & (i < n / 2)
         if self.respect_odd_to_even_travel_constraint:
-            n = len(self.nodes)
             # * traveling form node $𝑖 ∈ 𝑁 \ {0, 𝑛 + 1}$ to node $𝑗 ∈ 𝑁 \ {0, 𝑛 + 1}$ is forbidden
             # when: (i) $𝑖$ is an odd number, (ii) $𝑗$ is an even number, and (iii) $𝑖 ≥ 𝑛/2$
-            if (
-                int(node_from.id) % 2 == 1 and
-                int(node_to.id) % 2 == 0 and
-                int(node_from.id) >= n / 2
-            ):
-                return False
-        return True
+            invalid_edges |= (i % 2 == 1) & (j % 2 == 0) & (i >= n / 2)
+        valid_edges = ~invalid_edges
+        if n:
+            valid_edges[n - 1, :] = j[0] == 0  # Allow return to depot only from last node
+            valid_edges[0, :] = True  # Allow leaving depot, and finishing at last node
+            valid_edges[:, 0] = True
+        self.valid_edges = valid_edges
+        return valid_edges
+
+    def is_edge_valid(self, node_from: Node, node_to: Node) -> bool:
+        """Check if an edge between two nodes is valid."""
+        if self.valid_edges is None:
+            self.build_validity_matrix()
+        return bool(self.valid_edges[node_from.id, node_to.id])
 
     def neighbors(
             self,
@@ -71,29 +84,40 @@ class EdgeManager:
         ) -> list[Node]:
         """Get all neighboring nodes for a given node ID."""
         if node_id not in self.nodes:
-            self.logger.warning(f"Node ID {node_id} not found in EdgeManager.")
+            self.logger.warning("Node ID %s not found in EdgeManager.", node_id)
             return []
         if candidates and len(candidates) == 0:
-            self.logger.info(f"No candidate nodes provided for neighbors of node ID {node_id}.")
+            self.logger.info("No candidate nodes provided for neighbors of node ID %s.", node_id)
             return []
 
-        candidates = candidates or list(self.nodes.values())
-
-        if self.nodes[node_id] in candidates:
-            candidates.remove(self.nodes[node_id])
+        candidates = candidates or self.nodes.values()
+        candidate_ids = np.fromiter((n.id for n in candidates), dtype=np.int32, count=len(candidates))
+        is_other_node = candidate_ids != node_id
 
-        if len(candidates) == 0:
-            self.logger.info(f"No candidate nodes identified for neighbors of node ID {node_id}.")
+        if not is_other_node.any():
+            self.logger.info("No candidate nodes identified for neighbors of node ID %s.", node_id)
             return []
 
-        candidates = [n for n in candidates if self.is_edge_valid(self.nodes[node_id], n)]
+        if self.valid_edges is None:
+            self.build_validity_matrix()
+        is_neighbor = is_other_node & self.valid_edges[node_id, candidate_ids]
+        candidates = list(compress(candidates, is_neighbor))
 
         if sort_by_distance:
-            distance_manager = distance_manager or EuclidianDistanceManager(logger=self.logger)
-            candidates.sort(
-                key=lambda node: distance_manager.get_distance(self.nodes[node_id], node),
-                reverse=False,  # closest first
+            distance_manager = distance_manager or EuclidianDistanceManager(
+                nb_of_nodes=len(self.nodes),
+                logger=self.logger,
             )
+            if distance_manager.distance_matrix is None:
+                nodes = list(self.nodes.values())
+                distance_manager.precompute(
+                    coords=np.array([(node.x, node.y) for node in nodes], dtype=np.float64).reshape(-1, 2),
+                    ids=np.fromiter((node.id for node in nodes), dtype=np.int32, count=len(nodes)),
+                )
+            distances = distance_manager.distance_matrix[node_id, candidate_ids[is_neighbor]]
+            # closest first, stable so that equally distant nodes keep their order
+            order = np.argsort(distances, kind="stable")[:max_neighbors]
+            return [candidates[k] for k in order]
 
         if max_neighbors is not None:
             return candidates[:max_neighbors]
@@ -1,13 +1,27 @@
+from bisect import insort
+
+import numpy as np
+
 from datastore.distance_manager import EuclidianDistanceManager
 from schemas.node import Node
 from utils.logger import Logger
 
 
 class NodeManager:
-    """A manager for Node objects."""
+    """A manager for Node objects.
+
+    Next to the Node objects, the coordinates and IDs are kept as a struct of arrays,
+    in the order the nodes were added, for vectorised computations over all nodes.
+    """
 
     logger: Logger
     nodes: dict[str, Node] = {}
+    _xs: np.ndarray
+    _ys: np.ndarray
+    _iids: np.ndarray
+    _positions: dict[int, int]
+    n: int
+    sorted_iids: list[int]
 
     def __init__(
             self,
@@ -16,10 +30,49 @@ class NodeManager:
         """Initialize the node manager."""
         self.logger = logger or Logger(__name__)
         self.nodes = {}
+        self._xs = np.empty(0, dtype=np.float64)
+        self._ys = np.empty(0, dtype=np.float64)
+        self._iids = np.empty(0, dtype=np.int32)
+        self._positions = {}
+        self.n = 0  # number of nodes, including the depots
+        self.sorted_iids = []
 
     def add_node(self, node: Node) -> None:
         """Add a Node to the manager."""
         self.nodes[node.id] = node
+        position = self._positions.setdefault(node.id, len(self._positions))
+        if position == self.n:
+            self.n += 1
+            insort(self.sorted_iids, node.id)
+        if position == len(self._iids):
+            # grow the arrays geometrically, so adding n nodes costs O(n) amortised
+            capacity = max(2 * len(self._iids), 16)
+            self._xs = np.resize(self._xs, capacity)
+            self._ys = np.resize(self._ys, capacity)
+            self._iids = np.resize(self._iids, capacity)
+        self._xs[position] = node.x
+        self._ys[position] = node.y
+        self._iids[position] = node.id
+
+    @property
+    def xs(self) -> np.ndarray:
+        """Get the x coordinates of all nodes."""
+        return self._xs[:self.n]
+
+    @property
+    def ys(self) -> np.ndarray:
+        """Get the y coordinates of all nodes."""
+        return self._ys[:self.n]
+
+    @property
+    def iids(self) -> np.ndarray:
+        """Get the IDs of all nodes."""
+        return self._iids[:self.n]
+
+    @property
+    def coords(self) -> np.ndarray:
+        """Get the coordinates of all nodes as an (n, 2) array."""
+        return np.column_stack([self.xs, self.ys])
 
     def get_node(self, node_id: str) -> Node | None:
         """Retrieve a Node by its ID."""
@@ -0,0 +1,23 @@
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True, fastmath=True)
+def objective_value(
+        ids: np.ndarray,
+        distance_matrix: np.ndarray,
+        l_value: float,
+    ) -> float:
+    """Calculate the objective function value L·Δ + D of the route given by its node IDs.
+
+    Expects at least two node IDs. Distances are accumulated in float64 whatever the matrix dtype.
+    """
+    total_distance = float(distance_matrix[ids[0], ids[1]])
+    max_distance = total_distance
+    min_distance = total_distance
+    for k in range(1, ids.shape[0] - 1):
+        distance = float(distance_matrix[ids[k], ids[k + 1]])
+        total_distance += distance
+        max_distance = max(max_distance, distance)
+        min_distance = min(min_distance, distance)
+    return l_value * (max_distance - min_distance) + total_distance
@@ -1,15 +1,16 @@
-from functools import cache
+import numpy as np
+from sortedcontainers import SortedList
 
 from datastore.distance_manager import EuclidianDistanceManager
 from datastore.edge_manager import EdgeManager
 from datastore.node_manager import NodeManager
+from eval._kernels import objective_value
 from schemas.route import Route
 from utils.logger import Logger
 
 MIN_ROUTE_NODES = 2  # Including start and end depot nodes
 
 
-@cache
 def get_l_value(
     node_manager: NodeManager,
     distance_manager: EuclidianDistanceManager,
@@ -24,16 +25,84 @@ def get_l_value(
         The L value
 
     """
-    n = len(node_manager.nodes) - 2  # Excluding start (0) and end (n+1) depot
+    if distance_manager.distance_matrix is None:
+        distance_manager.precompute(node_manager.coords, node_manager.iids)
+    return distance_manager.l_value
 
-    max_distance_matrix = 0.0
-    all_nodes = list(node_manager.nodes.values())
-    for i, node1 in enumerate(all_nodes):
-        for node2 in all_nodes[i + 1:]:
-            dist = distance_manager.get_distance(node1, node2)
-            max_distance_matrix = max(max_distance_matrix, dist)
 
-    return max_distance_matrix * n
+class RouteEdgeState:
+    """Edge distances of a route, kept for incremental evaluation of neighbouring routes.
+
+    The edge distances are held in a sorted multiset, so the objective value of a route that
+    differs by a few edges is evaluated in O(log n) rather than by a full rescan of the route.
+    """
+
+    distance_matrix: np.ndarray
+    l_value: float
+    total_distance: float
+    edge_distances: SortedList
+
+    def __init__(
+            self,
+            route: Route | None,
+            distance_matrix: np.ndarray,
+            l_value: float,
+        ) -> None:
+        """Initialize the state from the edges of the route, or empty if no route is given."""
+        self.distance_matrix = distance_matrix
+        self.l_value = l_value
+        self.total_distance = 0.0
+        self.edge_distances = SortedList()
+        if route is not None:
+            ids = route.ids
+            distances = distance_matrix[ids[:-1], ids[1:]]
+            self.total_distance = float(distances.sum(dtype=np.float64))
+            self.edge_distances.update(distances.tolist())
+
+    @property
+    def objective_value(self) -> float:
+        """Get the objective function value L·Δ + D of the route."""
+        return self.l_value * (self.edge_distances[-1] - self.edge_distances[0]) + self.total_distance
+
+    def objective_value_after(
+            self,
+            removed_edges: list[tuple[int, int]],
+            added_edges: list[tuple[int, int]],
+        ) -> float:
+        """Get the objective function value of the route with the removed edges replaced by the added edges.
+
+        Edges are (node ID, node ID) pairs. The state itself is left unchanged.
+        """
+        removed = [float(self.distance_matrix[i, j]) for i, j in removed_edges]
+        added = [float(self.distance_matrix[i, j]) for i, j in added_edges]
+        for distance in removed:
+            self.edge_distances.remove(distance)
+        self.edge_distances.update(added)
+        delta = self.edge_distances[-1] - self.edge_distances[0]
+        for distance in added:
+            self.edge_distances.remove(distance)
+        self.edge_distances.update(removed)
+        return self.l_value * delta + self.total_distance - sum(removed) + sum(added)
+
+    def after(
+            self,
+            removed_edges: list[tuple[int, int]],
+            added_edges: list[tuple[int, int]],
+        ) -> "RouteEdgeState":
+        """Get the state of the route with the removed edges replaced by the added edges, in O(n + k log n).
+
+        The state itself is left unchanged.
+        """
+        new_state = RouteEdgeState(route=None, distance_matrix=self.distance_matrix, l_value=self.l_value)
+        new_state.edge_distances = self.edge_distances.copy()
+        new_state.total_distance = self.total_distance
+        removed = [float(self.distance_matrix[i, j]) for i, j in removed_edges]
+        added = [float(self.distance_matrix[i, j]) for i, j in added_edges]
+        for distance in removed:
+            new_state.edge_distances.remove(distance)
+        new_state.edge_distances.update(added)
+        new_state.total_distance += sum(added) - sum(removed)
+        return new_state
 
 
 class RouteEvaluator:
@@ -43,6 +112,7 @@ class RouteEvaluator:
     node_manager: NodeManager
     edge_manager: EdgeManager
     distance_manager: EuclidianDistanceManager
+    forbidden_transitions: np.ndarray | None
 
     def __init__(
             self,
@@ -56,27 +126,64 @@ class RouteEvaluator:
         self.node_manager = node_manager
         self.edge_manager = edge_manager
         self.distance_manager = distance_manager
+        if self.distance_manager.distance_matrix is None:
+            self.distance_manager.precompute(self.node_manager.coords, self.node_manager.iids)
+        self.forbidden_transitions = None
+
+    def build_forbidden_transitions(self, n: int) -> np.ndarray:
+        """Precompute the sequence constraint violations as a boolean matrix indexed by node IDs 0..n+1.
+
+        Unlike the EdgeManager validity matrix, n excludes the depot nodes 0 and n+1,
+        and transitions from or to a depot node are never forbidden.
+        """
+        i = np.arange(n + 2)[:, None]
+        j = np.arange(n + 2)[None, :]
+        is_intermediate = (i != 0) & (i != n + 1) & (j != 0) & (j != n + 1)
+        even_to_odd = (i % 2 == 0) & (j % 2 == 1) & (i < n / 2)
+        odd_to_even = (i % 2 == 1) & (j % 2 == 0) & (i >= n / 2)
+        self.forbidden_transitions = is_intermediate & (even_to_odd | odd_to_even)
+        return self.forbidden_transitions
+
+    def get_forbidden_transitions(self) -> np.ndarray:
+        """Get the forbidden transitions matrix for the current nodes, rebuilt when their number has changed."""
+        n = self.node_manager.n - 2  # Excluding 0 and n+1
+        forbidden_transitions = self.forbidden_transitions
+        if forbidden_transitions is None or forbidden_transitions.shape[0] != n + 2:
+            forbidden_transitions = self.build_forbidden_transitions(n)
+        return forbidden_transitions
+
+    def has_forbidden_transition(self, ids: np.ndarray) -> bool:
+        """Check if any consecutive pair of the node IDs is a forbidden transition.
+
+        Only checks the sequence constraints, not the route level constraints of `is_valid_route`.
+        """
+        return bool(self.get_forbidden_transitions()[ids[:-1], ids[1:]].any())
+
+    def count_forbidden_transitions(self, ids: np.ndarray) -> int:
+        """Count the consecutive pairs of the node IDs that are forbidden transitions.
+
+        A move that replaces a few transitions changes the count by those only, so operators can check
+        the sequence constraints of a candidate without creating it.
+        """
+        return int(self.get_forbidden_transitions()[ids[:-1], ids[1:]].sum())
 
     def total_distance_and_distances(
             self,
             route: Route,
-        ) -> tuple[float, list[float]]:
-        """Calculate the total distance of the route."""
-
-        if len(route.sequence) < MIN_ROUTE_NODES:
-            return 0.0, []
+        ) -> tuple[float, np.ndarray]:
+        """Calculate the total distance of the route and the distance of each consecutive node pair."""
 
-        total_distance = 0.0
-        distances: list[float] = []
-        for i in range(len(route.sequence) - 1):
-            curr_distance = self.distance_manager.get_distance(route.sequence[i], route.sequence[i + 1])
-            distances.append(curr_distance)
-            total_distance += curr_distance
+        if len(route) < MIN_ROUTE_NODES:
+            return 0.0, np.empty(0)
 
-        if not distances:
-            return 0.0, []
-
-        return total_distance, distances
+        if self.distance_manager.distance_matrix is None:
+            # Without the precomputed matrix, the distances are calculated from the coordinates at once
+            xy = route.xy
+            distances = self.distance_manager.calculate_distances(xy[:-1], xy[1:])
+        else:
+            ids = route.ids
+            distances = self.distance_manager.matrix()[ids[:-1], ids[1:]]
+        return float(distances.sum(dtype=np.float64)), distances
 
     def total_distance(self, route: Route) -> float:
         """Calculate the total distance of the route."""
@@ -101,27 +208,76 @@ class RouteEvaluator:
             The objective function value
 
         """
-        # Calculate D (total distance)
-        d_value, distances = self.total_distance_and_distances(route=route)
+        if len(route) < MIN_ROUTE_NODES:
+            msg = f"Route must have at least {MIN_ROUTE_NODES} nodes to calculate the objective value"
+            raise ValueError(msg)
+        return objective_value(route.ids, self.distance_manager.matrix(), self.distance_manager.l_value)
 
-        # Calculate Δ (delta)
-        max_distance = max(distances)
-        min_distance = min(distances)
-        delta = max_distance - min_distance
-        self.logger.debug(f"Delta calculation: maxD={max_distance}, minD={min_distance}, Δ={delta}")
+    def edge_state(self, route: Route) -> RouteEdgeState:
+        """Get the edge state of the route for incremental evaluation of its neighbours.
 
-        # Calculate L
-        l_value = get_l_value(self.node_manager, self.distance_manager)
+        The state is kept on the route, so it is only built once per sequence.
+        """
+        edge_state = route._edge_state
+        if edge_state is None or edge_state.distance_matrix is not self.distance_manager.distance_matrix:
+            edge_state = RouteEdgeState(
+                route=route,
+                distance_matrix=self.distance_manager.distance_matrix,
+                l_value=self.distance_manager.l_value,
+            )
+            route._edge_state = edge_state
+        return edge_state
+
+    def carry_edge_state(
+            self,
+            new_route: Route,
+            edge_state: RouteEdgeState,
+            removed_edges: list[tuple[int, int]],
+            added_edges: list[tuple[int, int]],
+        ) -> None:
+        """Keep the edge state on a route reached from the route of `edge_state` by replacing the removed edges.
 
-        # Calculate objective value
-        objective_value = l_value * delta + d_value
+        Lets the next search from `new_route` skip rebuilding the sorted edge distances.
+        """
+        new_route._edge_state = edge_state.after(removed_edges, added_edges)
+
+    def has_valid_structure(
+        self,
+        route: Route,
+    ) -> bool:
+        """Check the route level constraints of `is_valid_route`, without the sequence constraints.
 
-        self.logger.debug(
-            f"Objective calculation: L={l_value:.2f}, Δ={delta:.2f}, D={d_value:.2f}, "
-            f"Objective={objective_value:.2f}",
-        )
+        These hold for every route reached from a valid route by moves that keep the depots in place
+        and only reorder the intermediate nodes.
+        """
+        if len(route) < MIN_ROUTE_NODES:
+            self.logger.warning("Route has fewer than 2 nodes")
+            return False
 
-        return objective_value
+        # Read the node IDs of the route once
+        ids = route.ids
+
+        # Check if route starts at node 0
+        if ids[0] != 0:
+            self.logger.warning("Route does not start at node 0, starts at %s", ids[0])
+            return False
+
+        # Determine n from the number of nodes, node IDs are the integers 0..n+1
+        n = self.node_manager.n - 2  # Excluding 0 and n+1
+
+        # Check if route ends at node n+1
+        expected_end_id = n + 1
+        if ids[-1] != expected_end_id:
+            self.logger.warning("Route does not end at node %s, ends at %s", expected_end_id, ids[-1])
+            return False
+
+        # Check if all intermediate nodes are visited exactly once
+        intermediate_nodes = ids[1:-1].tolist()
+        if len(intermediate_nodes) != n or set(intermediate_nodes) != set(range(1, n + 1)):
+            self.logger.warning("Not all intermediate nodes are visited exactly once")
+            return False
+
+        return True
 
     def is_valid_route(
         self,
@@ -143,64 +299,33 @@ class RouteEvaluator:
             True if the route is valid, False otherwise
 
         """
-        if len(route.sequence) < MIN_ROUTE_NODES:
-            self.logger.warning("Route has fewer than 2 nodes")
+        if not self.has_valid_structure(route):
             return False
 
-        # Check if route starts at node 0
-        if route.sequence[0].id not in {"0", 0}:
-            self.logger.warning(f"Route does not start at node 0, starts at {route.sequence[0].id}")
-            return False
+        # Read the node IDs of the route once
+        ids = route.ids
+        n = self.node_manager.n - 2  # Excluding 0 and n+1
 
-        # Get all node IDs and sort them to determine n
-        # assuming node IDs are integers
-        all_node_ids = sorted([int(node_id) for node_id in self.node_manager.all_node_ids()])
-        n = len(all_node_ids) - 2  # Excluding 0 and n+1
-
-        # Check if route ends at node n+1
-        expected_end_id = n + 1
-        if int(route.sequence[-1].id) != expected_end_id:
-            self.logger.warning(f"Route does not end at node {expected_end_id}, ends at {route.sequence[-1].id}")
-            return False
-
-        # Check if all intermediate nodes are visited exactly once
-        intermediate_nodes = [int(node.id) for node in route.sequence[1:-1]]
-        expected_intermediate = list(range(1, n + 1))
-
-        if sorted(intermediate_nodes) != sorted(expected_intermediate):
-            self.logger.warning("Not all intermediate nodes are visited exactly once")
-            return False
-
-        # Check sequence constraints for consecutive node pairs
-        expected_start_id = 0
-        for i in range(len(route.sequence) - 1):
-            current_node = route.sequence[i]
-            next_node = route.sequence[i + 1]
-
-            # Skip constraints for depot nodes (0 and n+1)
-            if int(current_node.id) == expected_start_id or int(current_node.id) == expected_end_id:
-                continue
-            if int(next_node.id) == expected_start_id or int(next_node.id) == expected_end_id:
-                continue
-
-            current_id = int(current_node.id)
-            next_id = int(next_node.id)
+        # Check sequence constraints for all consecutive node pairs at once
+        violations = self.get_forbidden_transitions()[ids[:-1], ids[1:]]
+        if violations.any():
+            k = int(violations.argmax())  # first violated transition
+            current_id, next_id = int(ids[k]), int(ids[k + 1])
 
             # Constraint 1: Even→Odd forbidden when i < n/2
-            if current_id % 2 == 0 and next_id % 2 == 1 and current_id < n / 2:
+            if current_id % 2 == 0:
                 self.logger.warning(
-                    f"Constraint violated: Even→Odd transition from {current_id} to {next_id} "
-                    f"with {current_id} < n/2 (n={n})",
+                    "Constraint violated: Even→Odd transition from %s to %s with %s < n/2 (n=%s)",
+                    current_id, next_id, current_id, n,
                 )
                 return False
 
             # Constraint 2: Odd→Even forbidden when i >= n/2
-            if current_id % 2 == 1 and next_id % 2 == 0 and current_id >= n / 2:
-                self.logger.warning(
-                    f"Constraint violated: Odd→Even transition from {current_id} to {next_id} "
-                    f"with {current_id} >= n/2 (n={n})",
-                )
-                return False
+            self.logger.warning(
+                "Constraint violated: Odd→Even transition from %s to %s with %s >= n/2 (n=%s)",
+                current_id, next_id, current_id, n,
+            )
+            return False
 
         self.logger.info("Route is valid")
         return True
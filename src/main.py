@@ -56,7 +56,9 @@ logger.level = "INFO"
 distance_mngr = EuclidianDistanceManager(
     nb_of_nodes=len(nodes),
     logger=logger,
+    dtype=os.getenv("DISTANCE_MATRIX_DTYPE", "float64"),
 )
+distance_mngr.precompute(node_mngr.coords, node_mngr.iids)
 
 # ==================
 # COMPUTE LOWER AND UPPER BOUNDS
@@ -248,6 +250,7 @@ route_exporter.plot_route(
     filepath=Path(os.getenv("OUTPUT_DIR"), f"{title}.png").absolute(),
 )
 logger.info("Route plot saved.")
+route_exporter.close()
 route_exporter.report_to_file(
     route=best_route,
     filepath=Path(os.getenv("OUTPUT_DIR"), f"{title}.txt").absolute(),
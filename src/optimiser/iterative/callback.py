@@ -102,7 +102,7 @@ class Callback:
         """
 
         route_sequences = {
-            iteration: [node.id for node in route.sequence]
+            iteration: route.ids.tolist()
             for iteration, route in self.routes.items()
         }
 
@@ -74,7 +74,7 @@ class LocalSearchImprover:
         best_seed_routes = []
         best_seed_route_value = float("inf")
         for route in self.seed_routes:
-            self.logger.debug(f"Seed route with {len(route.sequence)} nodes.")
+            self.logger.debug(f"Seed route with {len(route)} nodes.")
             route_value = self.route_eval.calculate_objective_value(route=route)
             if route_value < best_seed_route_value:
                 best_seed_route_value = route_value
@@ -83,8 +83,14 @@ class LocalSearchImprover:
         iteration_count = 0
         for seed_route in best_seed_routes:
             route = seed_route.copy()
-            route_value = self.route_eval.calculate_objective_value(route=route)
+            route_value = best_seed_route_value  # the copy has the same sequence
+            # The operations search deterministically, so once none of them improves the current route
+            # in a row, the route is a local optimum for all of them and later iterations cannot improve it
+            iterations_without_improvement = 0
             while not self.termination.should_terminate(iteration_count=iteration_count):
+                if iterations_without_improvement >= len(self.operations):
+                    self.logger.debug("Local optimum reached after %d iterations.", iteration_count)
+                    break
                 operation = self.operations[iteration_count % len(self.operations)]
                 new_route = operation.apply_first_improvement(route=route)
                 new_route_value = self.route_eval.calculate_objective_value(route=new_route)
@@ -96,10 +102,13 @@ class LocalSearchImprover:
                     )
                     route_value = new_route_value
                     route = new_route
+                    iterations_without_improvement = 0
                     self.callback.save_route(
                         iteration=iteration_count,
                         route=new_route,
                     )
+                else:
+                    iterations_without_improvement += 1
                 self.callback.on_iteration(
                     iteration=iteration_count,
                     current_value=new_route_value,
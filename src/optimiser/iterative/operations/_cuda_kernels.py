@@ -0,0 +1,236 @@
+import numpy as np
+from numba import cuda
+
+from optimiser.iterative.operations._kernels import NO_MOVE, _route_arrays
+
+THREADS_PER_BLOCK = (16, 16)  # (v2, v1) threads of the pair kernel
+THREADS_PER_ROW_BLOCK = 128  # v1 threads of the row reduction
+RANKED_EDGES = 4  # longest (shortest) edges of the route one of which stays in the route after a swap
+
+
+def is_available() -> bool:
+    """Check if a CUDA device is available for the 3-opt search."""
+    return cuda.is_available()
+
+
+@cuda.jit(device=True)
+def _kept_extreme(edges: np.ndarray, ranked: np.ndarray, r1: int, r2: int, r3: int) -> float:
+    """Get the first ranked edge distance that is not one of the three removed edges."""
+    for rank in range(RANKED_EDGES):
+        k = ranked[rank]
+        if k != r1 and k != r2 and k != r3:
+            return edges[k]
+    return edges[ranked[0]]
+
+
+@cuda.jit
+def _scan_3opt_pairs(
+        ids: np.ndarray,
+        distance_matrix: np.ndarray,
+        l_value: float,
+        total_distance: float,
+        current_value: float,
+        tolerance: float,
+        reconnection_edges: np.ndarray,
+        reconnection_reversed: np.ndarray,
+        reconnection_order: np.ndarray,
+        forbidden_transitions: np.ndarray,
+        edges: np.ndarray,
+        longest: np.ndarray,
+        shortest: np.ndarray,
+        forward_sums: np.ndarray,
+        backward_sums: np.ndarray,
+        check_constraints: bool,
+        pair_moves: np.ndarray,
+        pair_values: np.ndarray,
+    ) -> None:
+    """Find the best improving 3-opt swap with the first two cut points of the thread, see `best_3opt`.
+
+    Writes the third cut point and reconnection type of the swap (v3 is NO_MOVE if none) and its value
+    to the slot of the cut points, pairs outside v1 < v2 are skipped.
+    """
+    v2, row = cuda.grid(2)
+    route_length = ids.shape[0]
+    v1 = row + 1
+    if v1 > route_length - 5 or v2 <= v1 or v2 > route_length - 3:
+        return
+
+    endpoints = cuda.local.array(6, dtype=np.int64)
+    best_v3 = NO_MOVE
+    best_type = 0
+    best_value = current_value
+    for v3 in range(v2 + 1, route_length - 1):
+        endpoints[0] = ids[v1 - 1]
+        endpoints[1] = ids[v1]
+        endpoints[2] = ids[v2 - 1]
+        endpoints[3] = ids[v2]
+        endpoints[4] = ids[v3 - 1]
+        endpoints[5] = ids[v3]
+        removed = 0.0 + edges[v1 - 1] + edges[v2 - 1] + edges[v3 - 1]
+        kept_max = _kept_extreme(edges, longest, v1 - 1, v2 - 1, v3 - 1)
+        kept_min = _kept_extreme(edges, shortest, v1 - 1, v2 - 1, v3 - 1)
+        # Transitions kept in segments A and D, and within B and C in both directions
+        kept_forbidden = forward_sums[v1 - 1] + forward_sums[route_length - 1] - forward_sums[v3]
+        b_forward = forward_sums[v2 - 1] - forward_sums[v1]
+        b_backward = backward_sums[v2 - 1] - backward_sums[v1]
+        c_forward = forward_sums[v3 - 1] - forward_sums[v2]
+        c_backward = backward_sums[v3 - 1] - backward_sums[v2]
+
+        for k in range(reconnection_order.shape[0]):
+            reconnection_type = reconnection_order[k]
+            added = 0.0
+            max_distance = kept_max
+            min_distance = kept_min
+            added_forbidden = 0
+            for e in range(3):
+                node_from = endpoints[reconnection_edges[reconnection_type, e, 0]]
+                node_to = endpoints[reconnection_edges[reconnection_type, e, 1]]
+                distance = float(distance_matrix[node_from, node_to])
+                added += distance
+                max_distance = max(max_distance, distance)
+                min_distance = min(min_distance, distance)
+                added_forbidden += int(forbidden_transitions[node_from, node_to])
+            new_value = l_value * (max_distance - min_distance) + total_distance - removed + added
+            if new_value >= best_value - tolerance:
+                continue
+            if check_constraints:
+                b_reversed = reconnection_reversed[reconnection_type, 0]
+                c_reversed = reconnection_reversed[reconnection_type, 1]
+                if (
+                    kept_forbidden + added_forbidden
+                    + (b_backward if b_reversed else b_forward)
+                    + (c_backward if c_reversed else c_forward)
+                ):
+                    continue
+
+            best_v3 = v3
+            best_type = reconnection_type
+            best_value = new_value
+
+    pair_moves[row, v2, 0] = best_v3
+    pair_moves[row, v2, 1] = best_type
+    pair_values[row, v2] = best_value
+
+
+@cuda.jit
+def _reduce_rows(
+        pair_moves: np.ndarray,
+        pair_values: np.ndarray,
+        current_value: float,
+        tolerance: float,
+        row_moves: np.ndarray,
+        row_values: np.ndarray,
+    ) -> None:
+    """Reduce the swaps of the pairs of cut points of a row of the first cut point, in order of v2."""
+    row = cuda.grid(1)
+    if row >= row_values.shape[0]:
+        return
+    route_length = pair_values.shape[1]
+    best_v2 = NO_MOVE
+    best_v3 = NO_MOVE
+    best_type = 0
+    best_value = current_value
+    for v2 in range(row + 2, route_length - 2):
+        if pair_moves[row, v2, 0] != NO_MOVE and pair_values[row, v2] < best_value - tolerance:
+            best_v2 = v2
+            best_v3 = pair_moves[row, v2, 0]
+            best_type = pair_moves[row, v2, 1]
+            best_value = pair_values[row, v2]
+    row_moves[row, 0] = best_v2
+    row_moves[row, 1] = best_v3
+    row_moves[row, 2] = best_type
+    row_values[row] = best_value
+
+
+class CudaThreeOptSearch:
+    """Best improvement 3-opt search on a CUDA device.
+
+    The distance matrix and forbidden transitions are copied to the device once, and again only when
+    the search is given other arrays.
+    """
+
+    _device_arrays: dict[str, tuple[np.ndarray, object]]
+
+    def __init__(self) -> None:
+        """Initialise the search, without device arrays."""
+        self._device_arrays = {}
+
+    def _to_device(self, name: str, array: np.ndarray) -> object:
+        """Get the device copy of the array, copying it if it is not the array last copied as `name`."""
+        host_array, device_array = self._device_arrays.get(name, (None, None))
+        if host_array is not array:
+            device_array = cuda.to_device(np.ascontiguousarray(array))
+            self._device_arrays[name] = (array, device_array)
+        return device_array
+
+    def best_3opt(
+            self,
+            ids: np.ndarray,
+            distance_matrix: np.ndarray,
+            l_value: float,
+            total_distance: float,
+            current_value: float,
+            tolerance: float,
+            reconnection_edges: np.ndarray,
+            reconnection_reversed: np.ndarray,
+            reconnection_order: np.ndarray,
+            forbidden_transitions: np.ndarray,
+            check_constraints: bool,
+        ) -> tuple[int, int, int, int, float, int]:
+        """Find the best improving 3-opt swap of the route given by its node IDs, see `best_3opt`.
+
+        Each thread scans the third cut points of a pair (v1, v2) into its own slot, the slots are
+        reduced in order per row of v1 on the device, and the rows in order on the host. So the swap
+        found is the one of the CPU kernel, up to swaps whose values are within the tolerance.
+        """
+        route_length = ids.shape[0]
+        if route_length < 6:  # start, 3 intermediate segments, end
+            return NO_MOVE, NO_MOVE, NO_MOVE, 0, current_value, 0
+
+        edges, longest, shortest, forward_sums, backward_sums = _route_arrays(
+            ids, distance_matrix, forbidden_transitions,
+        )
+        nb_rows = route_length - 5
+        pair_moves = cuda.device_array((nb_rows, route_length, 2), dtype=np.int64)
+        pair_values = cuda.device_array((nb_rows, route_length))
+        blocks = (
+            (route_length + THREADS_PER_BLOCK[0] - 1) // THREADS_PER_BLOCK[0],
+            (nb_rows + THREADS_PER_BLOCK[1] - 1) // THREADS_PER_BLOCK[1],
+        )
+        _scan_3opt_pairs[blocks, THREADS_PER_BLOCK](
+            cuda.to_device(np.ascontiguousarray(ids, dtype=np.int64)),
+            self._to_device("distance_matrix", distance_matrix),
+            l_value, total_distance, current_value, tolerance,
+            self._to_device("reconnection_edges", reconnection_edges),
+            self._to_device("reconnection_reversed", reconnection_reversed),
+            self._to_device("reconnection_order", reconnection_order),
+            self._to_device("forbidden_transitions", forbidden_transitions),
+            cuda.to_device(edges),
+            cuda.to_device(longest[:RANKED_EDGES].copy()),
+            cuda.to_device(shortest[:RANKED_EDGES].copy()),
+            cuda.to_device(forward_sums),
+            cuda.to_device(backward_sums),
+            check_constraints,
+            pair_moves,
+            pair_values,
+        )
+        row_moves = cuda.device_array((nb_rows, 3), dtype=np.int64)
+        row_values = cuda.device_array(nb_rows)
+        row_blocks = (nb_rows + THREADS_PER_ROW_BLOCK - 1) // THREADS_PER_ROW_BLOCK
+        _reduce_rows[row_blocks, THREADS_PER_ROW_BLOCK](
+            pair_moves, pair_values, current_value, tolerance, row_moves, row_values,
+        )
+        row_moves = row_moves.copy_to_host()
+        row_values = row_values.copy_to_host()
+
+        best = (NO_MOVE, NO_MOVE, NO_MOVE, 0)
+        best_value = current_value
+        for row in range(nb_rows):
+            if row_moves[row, 0] != NO_MOVE and row_values[row] < best_value - tolerance:
+                best = (row + 1, int(row_moves[row, 0]), int(row_moves[row, 1]), int(row_moves[row, 2]))
+                best_value = float(row_values[row])
+
+        # Each pair (v1, v2) has route_length - 2 - v2 third cut points, that is a triangular number per row
+        v1 = np.arange(1, nb_rows + 1)
+        evaluations = len(reconnection_order) * int(((route_length - 3 - v1) * (route_length - 2 - v1) // 2).sum())
+        return best[0], best[1], best[2], best[3], best_value, evaluations
@@ -0,0 +1,238 @@
+import numpy as np
+from numba import njit, prange
+
+NO_MOVE = -1  # Cut point returned when no improving move is found
+
+
+@njit(cache=True)
+def _kept_extreme(edges: np.ndarray, ranked: np.ndarray, r1: int, r2: int, r3: int) -> float:
+    """Get the first ranked edge distance that is not one of the three removed edges."""
+    for k in ranked[:4]:
+        if k != r1 and k != r2 and k != r3:
+            return edges[k]
+    return edges[ranked[0]]
+
+
+@njit(cache=True)
+def _prefix_sums(flags: np.ndarray) -> np.ndarray:
+    """Get the prefix sums of the flags, so that flags[a:b].sum() is sums[b] - sums[a]."""
+    sums = np.zeros(flags.shape[0] + 1, dtype=np.int64)
+    for k in range(flags.shape[0]):
+        sums[k + 1] = sums[k] + flags[k]
+    return sums
+
+
+@njit(cache=True)
+def _route_arrays(
+        ids: np.ndarray,
+        distance_matrix: np.ndarray,
+        forbidden_transitions: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Get the edge distances of the route, their rankings, and the prefix sums of its forbidden transitions."""
+    route_length = ids.shape[0]
+    edges = np.empty(route_length - 1)
+    forward = np.empty(route_length - 1, dtype=np.int64)
+    backward = np.empty(route_length - 1, dtype=np.int64)
+    for k in range(route_length - 1):
+        edges[k] = float(distance_matrix[ids[k], ids[k + 1]])
+        forward[k] = int(forbidden_transitions[ids[k], ids[k + 1]])
+        backward[k] = int(forbidden_transitions[ids[k + 1], ids[k]])
+    shortest = np.argsort(edges)
+    return edges, shortest[::-1].copy(), shortest, _prefix_sums(forward), _prefix_sums(backward)
+
+
+@njit(cache=True)
+def _scan_3opt(
+        v1: int,
+        ids: np.ndarray,
+        distance_matrix: np.ndarray,
+        l_value: float,
+        total_distance: float,
+        current_value: float,
+        tolerance: float,
+        reconnection_edges: np.ndarray,
+        reconnection_reversed: np.ndarray,
+        reconnection_order: np.ndarray,
+        forbidden_transitions: np.ndarray,
+        edges: np.ndarray,
+        longest: np.ndarray,
+        shortest: np.ndarray,
+        forward_sums: np.ndarray,
+        backward_sums: np.ndarray,
+        check_constraints: bool,
+        first: bool,
+    ) -> tuple[int, int, int, float, int]:
+    """Find the best (or first) improving 3-opt swap with first cut point v1, see `best_3opt`.
+
+    Returns:
+        The last two cut points and reconnection type of the swap (v2 is NO_MOVE if none), its value,
+        and the number of swaps evaluated
+
+    """
+    route_length = ids.shape[0]
+    endpoints = np.empty(6, dtype=np.int64)
+    best = (NO_MOVE, NO_MOVE, 0)
+    best_value = current_value
+    evaluations = 0
+    for v2 in range(v1 + 1, route_length - 2):
+        for v3 in range(v2 + 1, route_length - 1):
+            endpoints[0] = ids[v1 - 1]
+            endpoints[1] = ids[v1]
+            endpoints[2] = ids[v2 - 1]
+            endpoints[3] = ids[v2]
+            endpoints[4] = ids[v3 - 1]
+            endpoints[5] = ids[v3]
+            removed = 0.0 + edges[v1 - 1] + edges[v2 - 1] + edges[v3 - 1]
+            kept_max = _kept_extreme(edges, longest, v1 - 1, v2 - 1, v3 - 1)
+            kept_min = _kept_extreme(edges, shortest, v1 - 1, v2 - 1, v3 - 1)
+            # Transitions kept in segments A and D, and within B and C in both directions
+            kept_forbidden = forward_sums[v1 - 1] + forward_sums[route_length - 1] - forward_sums[v3]
+            b_forward = forward_sums[v2 - 1] - forward_sums[v1]
+            b_backward = backward_sums[v2 - 1] - backward_sums[v1]
+            c_forward = forward_sums[v3 - 1] - forward_sums[v2]
+            c_backward = backward_sums[v3 - 1] - backward_sums[v2]
+
+            # Try all reconnection types in the given order (skip 0 which is original)
+            for reconnection_type in reconnection_order:
+                evaluations += 1
+                added = 0.0
+                max_distance = kept_max
+                min_distance = kept_min
+                added_forbidden = 0
+                for e in range(3):
+                    node_from = endpoints[reconnection_edges[reconnection_type, e, 0]]
+                    node_to = endpoints[reconnection_edges[reconnection_type, e, 1]]
+                    distance = float(distance_matrix[node_from, node_to])
+                    added += distance
+                    max_distance = max(max_distance, distance)
+                    min_distance = min(min_distance, distance)
+                    added_forbidden += int(forbidden_transitions[node_from, node_to])
+                new_value = l_value * (max_distance - min_distance) + total_distance - removed + added
+                if new_value >= best_value - tolerance:
+                    continue
+                if check_constraints:
+                    b_reversed = reconnection_reversed[reconnection_type, 0]
+                    c_reversed = reconnection_reversed[reconnection_type, 1]
+                    if (
+                        kept_forbidden + added_forbidden
+                        + (b_backward if b_reversed else b_forward)
+                        + (c_backward if c_reversed else c_forward)
+                    ):
+                        continue
+
+                best = (v2, v3, reconnection_type)
+                best_value = new_value
+                if first:
+                    return best[0], best[1], best[2], best_value, evaluations
+    return best[0], best[1], best[2], best_value, evaluations
+
+
+@njit(cache=True)
+def scan_3opt(
+        ids: np.ndarray,
+        distance_matrix: np.ndarray,
+        l_value: float,
+        total_distance: float,
+        current_value: float,
+        tolerance: float,
+        reconnection_edges: np.ndarray,
+        reconnection_reversed: np.ndarray,
+        reconnection_order: np.ndarray,
+        forbidden_transitions: np.ndarray,
+        check_constraints: bool,
+        first: bool,
+        exit_value: float,
+    ) -> tuple[int, int, int, int, float, int]:
+    """Find the first, or the best, improving 3-opt swap of the route given by its node IDs in a sequential scan.
+
+    See `best_3opt`, with the reconnection types tried in `reconnection_order`. The scan of the best swap
+    stops after the row of a first cut point once the best value found is below `exit_value`, use -inf
+    to scan all rows.
+    """
+    route_length = ids.shape[0]
+    if route_length < 6:  # start, 3 intermediate segments, end
+        return NO_MOVE, NO_MOVE, NO_MOVE, 0, current_value, 0
+
+    edges, longest, shortest, forward_sums, backward_sums = _route_arrays(ids, distance_matrix, forbidden_transitions)
+    best = (NO_MOVE, NO_MOVE, NO_MOVE, 0)
+    best_value = current_value
+    evaluations = 0
+    for v1 in range(1, route_length - 4):
+        v2, v3, reconnection_type, new_value, row_evaluations = _scan_3opt(
+            v1, ids, distance_matrix, l_value, total_distance, best_value, tolerance,
+            reconnection_edges, reconnection_reversed, reconnection_order, forbidden_transitions,
+            edges, longest, shortest, forward_sums, backward_sums, check_constraints, first,
+        )
+        evaluations += row_evaluations
+        if v2 != NO_MOVE:
+            best = (v1, v2, v3, reconnection_type)
+            best_value = new_value
+            if first:
+                break
+        if best_value < exit_value:
+            break
+    return best[0], best[1], best[2], best[3], best_value, evaluations
+
+
+@njit(cache=True, parallel=True)
+def best_3opt(
+        ids: np.ndarray,
+        distance_matrix: np.ndarray,
+        l_value: float,
+        total_distance: float,
+        current_value: float,
+        tolerance: float,
+        reconnection_edges: np.ndarray,
+        reconnection_reversed: np.ndarray,
+        reconnection_order: np.ndarray,
+        forbidden_transitions: np.ndarray,
+        check_constraints: bool,
+    ) -> tuple[int, int, int, int, float, int]:
+    """Find the best improving 3-opt swap of the route given by its node IDs.
+
+    Scans cut points v1 < v2 < v3 and the reconnection types of `reconnection_order` in order, and
+    takes a swap when its objective value L·Δ + D improves on the best value so far by more than the
+    tolerance. Only the three changed edges are evaluated, and the new longest (shortest) edge is one of
+    the added edges or one of the four longest (shortest) edges of the route that is not removed.
+
+    With `check_constraints`, swaps with a forbidden transition are skipped, counted from prefix sums
+    of the forbidden transitions of the route in both directions.
+
+    Rows of the first cut point are scanned in parallel, each into its own slot, and reduced in order
+    at the end. Each row compares its swaps with `current_value` rather than the best value of the
+    earlier rows, so the swap found is the one of a sequential scan, up to swaps whose values are within
+    the tolerance.
+
+    Returns:
+        The cut points and reconnection type of the swap (v1 is NO_MOVE if none), its value,
+        and the number of swaps evaluated
+
+    """
+    route_length = ids.shape[0]
+    if route_length < 6:  # start, 3 intermediate segments, end
+        return NO_MOVE, NO_MOVE, NO_MOVE, 0, current_value, 0
+
+    edges, longest, shortest, forward_sums, backward_sums = _route_arrays(ids, distance_matrix, forbidden_transitions)
+    nb_rows = route_length - 5
+    row_moves = np.empty((nb_rows, 3), dtype=np.int64)
+    row_values = np.empty(nb_rows)
+    row_evaluations = np.empty(nb_rows, dtype=np.int64)
+    for row in prange(nb_rows):
+        v2, v3, reconnection_type, new_value, evaluations = _scan_3opt(
+            row + 1, ids, distance_matrix, l_value, total_distance, current_value, tolerance,
+            reconnection_edges, reconnection_reversed, reconnection_order, forbidden_transitions,
+            edges, longest, shortest, forward_sums, backward_sums, check_constraints, False,
+        )
+        row_moves[row, 0] = v2
+        row_moves[row, 1] = v3
+        row_moves[row, 2] = reconnection_type
+        row_values[row] = new_value
+        row_evaluations[row] = evaluations
+
+    best = (NO_MOVE, NO_MOVE, NO_MOVE, 0)
+    best_value = current_value
+    for row in range(nb_rows):
+        if row_moves[row, 0] != NO_MOVE and row_values[row] < best_value - tolerance:
+            best = (row + 1, row_moves[row, 0], row_moves[row, 1], row_moves[row, 2])
+            best_value = row_values[row]
+    return best[0], best[1], best[2], best[3], best_value, row_evaluations.sum()
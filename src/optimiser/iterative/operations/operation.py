@@ -1,16 +1,47 @@
 from abc import ABC, abstractmethod
+from collections.abc import Iterator
+
+import numpy as np
 
 from schemas.route import Route
 
+# Delta-evaluated objective values carry float round-off, real improvements are at least 0.01
+IMPROVEMENT_TOLERANCE = 1e-6
+RANDOM_BATCH_SIZE = 1024  # Uniform draws taken from the generator at once
+
 
 class Operation(ABC):
     """Abstract base class for operations in an iterative optimiser."""
 
+    rnd_generator: np.random.Generator
+    _random_draws: Iterator[float]
+
+    def randint(self, low: int, high: int) -> int:
+        """Get a random integer in [low, high], both included, as `random.randint`.
+
+        Uniform draws are taken from `rnd_generator` in batches, to avoid the overhead of a call
+        into the generator for every random index.
+        """
+        draw = next(self._random_draws, None)
+        if draw is None:
+            self._random_draws = iter(self.rnd_generator.random(RANDOM_BATCH_SIZE).tolist())
+            draw = next(self._random_draws)
+        return low + int(draw * (high - low + 1))
+
     @abstractmethod
     def apply(self, route: Route) -> Route:
         """Apply the operation to the given solution."""
         raise NotImplementedError
 
+    @abstractmethod
+    def changed_edges(
+            self,
+            route: Route,
+            *move: int,
+        ) -> tuple[list[tuple[int, int]], list[tuple[int, int]]]:
+        """Get the edges, as (node ID, node ID) pairs, removed from and added to the route by the move."""
+        raise NotImplementedError
+
     @abstractmethod
     def apply_best_improvement(self, route: Route) -> Route:
         """Apply the operation and return the best improvement found."""
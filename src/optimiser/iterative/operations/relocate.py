@@ -1,7 +1,9 @@
-from random import SystemRandom
+from collections.abc import Sequence
+
+import numpy as np
 
 from eval.route_eval import RouteEvaluator
-from optimiser.iterative.operations.operation import Operation
+from optimiser.iterative.operations.operation import IMPROVEMENT_TOLERANCE, Operation
 from schemas.route import Route
 from utils.logger import Logger
 
@@ -27,7 +29,7 @@ class Relocate(Operation):
 
     logger: Logger
     rnd_seed: int
-    rnd_generator: SystemRandom
+    rnd_generator: np.random.Generator
     route_eval: RouteEvaluator
 
     def __init__(
@@ -39,7 +41,8 @@ class Relocate(Operation):
         """Initialise the operation."""
         self.route_eval = route_eval
         self.rnd_seed = rnd_seed
-        self.rnd_generator = SystemRandom(x=self.rnd_seed)
+        self.rnd_generator = np.random.default_rng(self.rnd_seed)
+        self._random_draws = iter(())
         self.logger = logger or Logger(__name__)
 
     def apply(
@@ -64,7 +67,7 @@ class Relocate(Operation):
             The modified route (either new or the same object if inplace=True)
 
         """
-        route_length = len(route.sequence)
+        route_length = len(route)
 
         # Need at least 4 nodes to perform relocate
         if route_length < MIN_ROUTE_LENGTH:
@@ -74,8 +77,8 @@ class Relocate(Operation):
         # Generate random indices if not provided
         # We exclude the first and last nodes (depot nodes)
         if v1 is None or v2 is None:
-            v1 = self.rnd_generator.randint(1, route_length - 2)
-            v2 = self.rnd_generator.randint(v1, route_length - 2)
+            v1 = self.randint(1, route_length - 2)
+            v2 = self.randint(v1, route_length - 2)
         elif v1 > v2:
             # Ensure v1 <= v2
             v1, v2 = v2, v1
@@ -96,7 +99,7 @@ class Relocate(Operation):
             if not valid_positions:
                 self.logger.warning("No valid insertion positions available")
                 return route if inplace else route.copy()
-            insert_pos = self.rnd_generator.choice(valid_positions)
+            insert_pos = valid_positions[self.randint(0, len(valid_positions) - 1)]
         elif insert_pos < 0 or insert_pos >= route_length - (v2 - v1 + 1):
             # Validate insert_pos
             self.logger.error(
@@ -105,42 +108,101 @@ class Relocate(Operation):
             return route if inplace else route.copy()
 
         segment_length = v2 - v1 + 1
-        self.logger.debug(
-            f"Applying relocate: moving segment [{v1}:{v2}] (length={segment_length}) "
-            f"to position {insert_pos}",
-        )
+        if self.logger.is_enabled_for("DEBUG"):
+            self.logger.debug(
+                "Applying relocate: moving segment [%d:%d] (length=%d) to position %d",
+                v1, v2, segment_length, insert_pos,
+            )
 
         # Extract the segment to relocate
-        segment = route.sequence[v1:v2 + 1]
+        ids = route.ids
+        segment = ids[v1:v2 + 1]
 
         # Create new sequence without the segment
-        new_sequence = route.sequence[:v1] + route.sequence[v2 + 1:]
+        remaining = np.concatenate((ids[:v1], ids[v2 + 1:]))
 
         # Adjust insert position if needed (after removal, positions shift)
         adjusted_insert_pos = insert_pos if insert_pos < v1 else insert_pos - segment_length
 
         # Insert the segment at the new position
-        new_sequence = (
-            new_sequence[:adjusted_insert_pos] +
-            segment +
-            new_sequence[adjusted_insert_pos:]
-        )
+        new_ids = np.concatenate((
+            remaining[:adjusted_insert_pos],
+            segment,
+            remaining[adjusted_insert_pos:],
+        ))
 
         # Apply the change
+        nodes = self.route_eval.node_manager.nodes
         if inplace:
-            route.sequence = new_sequence
-            self.logger.debug(
-                f"Applied relocate in place: segment [{v1}:{v2}] to position {insert_pos}",
-            )
+            route.assign_ids(new_ids, nodes)
+            if self.logger.is_enabled_for("DEBUG"):
+                self.logger.debug("Applied relocate in place: segment [%d:%d] to position %d", v1, v2, insert_pos)
             return route
 
         # Create a new route
-        new_route = Route(name=route.name, sequence=new_sequence, logger=self.logger)
-        self.logger.debug(
-            f"Created new route with relocate: segment [{v1}:{v2}] to position {insert_pos}",
-        )
+        new_route = Route.from_ids(name=route.name, ids=new_ids, nodes=nodes)
+        if self.logger.is_enabled_for("DEBUG"):
+            self.logger.debug("Created new route with relocate: segment [%d:%d] to position %d", v1, v2, insert_pos)
         return new_route
 
+    def changed_edges(
+            self,
+            route: Route,
+            v1: int,
+            v2: int,
+            insert_pos: int,
+        ) -> tuple[list[tuple[int, int]], list[tuple[int, int]]]:
+        """Get the edges removed from and added to the route by moving the segment [v1:v2] to insert_pos.
+
+        The segment is inserted before route[insert_pos], insert_pos must not be within [v1, v2 + 1].
+        """
+        return self.move_edges(route.ids, v1=v1, v2=v2, insert_pos=insert_pos)
+
+    @staticmethod
+    def move_edges(
+            ids: Sequence[int] | np.ndarray,
+            v1: int,
+            v2: int,
+            insert_pos: int,
+        ) -> tuple[list[tuple[int, int]], list[tuple[int, int]]]:
+        """Get the edges removed from and added to the node IDs of a route by moving [v1:v2] to insert_pos."""
+        removed = [(ids[v1 - 1], ids[v1]), (ids[v2], ids[v2 + 1])]
+        added = [(ids[v1 - 1], ids[v2 + 1]), (ids[v2], ids[insert_pos])]
+        if insert_pos > 0:
+            removed.append((ids[insert_pos - 1], ids[insert_pos]))
+            added.append((ids[insert_pos - 1], ids[v1]))
+        return removed, added
+
+    def is_valid_move(
+            self,
+            route: Route,
+            v1: int,
+            v2: int,
+            insert_pos: int,
+            changes: tuple[list[tuple[int, int]], list[tuple[int, int]]],
+            forbidden_count: int | None,
+        ) -> bool:
+        """Check if moving the segment [v1:v2] to insert_pos gives a valid route, without creating it if possible.
+
+        A relocate keeps the nodes of the route and the direction of its transitions, and unless the segment
+        is moved to the front also the depots. So only the sequence constraints of the changed edges are
+        checked, against the count of forbidden transitions of the route, which is None when the route
+        level constraints of the route are not met. Moving the segment to the front of such a route
+        moves the start depot, and only a move to the front can make a route without them valid, which is
+        the one case where the route is created.
+        """
+        if forbidden_count is None:
+            return insert_pos == 0 and self.route_eval.is_valid_route(
+                route=self.apply(route, v1=v1, v2=v2, insert_pos=insert_pos, inplace=False),
+            )
+        if insert_pos == 0:
+            return False
+        forbidden_transitions = self.route_eval.get_forbidden_transitions()
+        removed, added = changes
+        forbidden_count -= sum(int(forbidden_transitions[i, j]) for i, j in removed)
+        forbidden_count += sum(int(forbidden_transitions[i, j]) for i, j in added)
+        return forbidden_count == 0
+
     def apply_best_improvement(
             self,
             route: Route,
@@ -159,11 +221,18 @@ class Relocate(Operation):
             The improved route (or original if no improvement found)
 
         """
-        best_route = route.copy()
-        orig_value = best_value = self.route_eval.calculate_objective_value(route)
-        improved = False
-
-        route_length = len(route.sequence)
+        edge_state = self.route_eval.edge_state(route)
+        orig_value = best_value = edge_state.objective_value
+        best_move = None
+
+        # The route level constraints are checked once, only the sequence constraints per move
+        forbidden_count = None
+        if only_valid and self.route_eval.has_valid_structure(route):
+            forbidden_count = self.route_eval.count_forbidden_transitions(route.ids)
+
+        # The node IDs are bound once as a list, the search only reads them
+        ids = route.ids.tolist()
+        route_length = len(ids)
         evaluations = 0
 
         # Try all possible relocate moves
@@ -176,39 +245,31 @@ class Relocate(Operation):
                     if v1 <= insert_pos <= v2 + 1:
                         continue
 
-                    # Create new route with this relocate
-                    new_route = self.apply(
-                        route,
-                        v1=v1,
-                        v2=v2,
-                        insert_pos=insert_pos,
-                        inplace=False,
-                    )
-                    if only_valid and not self.route_eval.is_valid_route(route=new_route):
-                        continue
-                    new_value = self.route_eval.calculate_objective_value(route=new_route)
+                    changes = self.move_edges(ids, v1=v1, v2=v2, insert_pos=insert_pos)
+                    new_value = edge_state.objective_value_after(*changes)
                     evaluations += 1
+                    if new_value >= best_value - IMPROVEMENT_TOLERANCE:
+                        continue
+                    if only_valid and not self.is_valid_move(
+                        route, v1=v1, v2=v2, insert_pos=insert_pos, changes=changes, forbidden_count=forbidden_count,
+                    ):
+                        continue
 
-                    # Check if this is an improvement
-                    if new_value < best_value:
-                        best_route = new_route
-                        best_value = new_value
-                        improved = True
-                        self.logger.debug(
-                            f"Found improvement with relocate [{v1}:{v2}] to {insert_pos}: "
-                            f"value reduced to {new_value:.2f}",
-                        )
-
-        if improved:
-            self.logger.info(
-                f"Best relocate improvement found after {evaluations} evaluations: "
-                f"value reduced from {orig_value:.2f} to {best_value:.2f}",
-            )
-        else:
-            self.logger.debug(
-                f"No relocate improvement found after {evaluations} evaluations",
-            )
+                    best_value = new_value
+                    best_move = (v1, v2, insert_pos, changes)
+
+        if best_move is None:
+            self.logger.debug("No relocate improvement found after %d evaluations", evaluations)
+            return route.copy()
 
+        # Create the new route once, for the best move
+        v1, v2, insert_pos, changes = best_move
+        best_route = self.apply(route, v1=v1, v2=v2, insert_pos=insert_pos, inplace=False)
+        self.route_eval.carry_edge_state(best_route, edge_state, *changes)
+        self.logger.info(
+            "Best relocate improvement found after %d evaluations: value reduced from %.2f to %.2f",
+            evaluations, orig_value, best_value,
+        )
         return best_route
 
     def apply_first_improvement(
@@ -229,8 +290,17 @@ class Relocate(Operation):
             The improved route (or original if no improvement found)
 
         """
-        curr_value = self.route_eval.calculate_objective_value(route)
-        route_length = len(route.sequence)
+        edge_state = self.route_eval.edge_state(route)
+        curr_value = edge_state.objective_value
+
+        # The route level constraints are checked once, only the sequence constraints per move
+        forbidden_count = None
+        if only_valid and self.route_eval.has_valid_structure(route):
+            forbidden_count = self.route_eval.count_forbidden_transitions(route.ids)
+
+        # The node IDs are bound once as a list, the search only reads them
+        ids = route.ids.tolist()
+        route_length = len(ids)
         evaluations = 0
 
         # Try relocate moves until we find an improvement
@@ -242,27 +312,25 @@ class Relocate(Operation):
                     if v1 <= insert_pos <= v2 + 1:
                         continue
 
-                    # Create new route with this relocate
-                    new_route = self.apply(
-                        route,
-                        v1=v1,
-                        v2=v2,
-                        insert_pos=insert_pos,
-                        inplace=False,
-                    )
-                    if only_valid and not self.route_eval.is_valid_route(route=new_route):
-                        continue
-                    new_value = self.route_eval.calculate_objective_value(route=new_route)
+                    changes = self.move_edges(ids, v1=v1, v2=v2, insert_pos=insert_pos)
+                    new_value = edge_state.objective_value_after(*changes)
                     evaluations += 1
+                    if new_value >= curr_value - IMPROVEMENT_TOLERANCE:
+                        continue
+                    if only_valid and not self.is_valid_move(
+                        route, v1=v1, v2=v2, insert_pos=insert_pos, changes=changes, forbidden_count=forbidden_count,
+                    ):
+                        continue
 
-                    # Return immediately if we find an improvement
-                    if new_value < curr_value:
-                        self.logger.info(
-                            f"First relocate improvement found at [{v1}:{v2}] "
-                            f"to {insert_pos} after {evaluations} evaluations: "
-                            f"value reduced from {curr_value:.2f} to {new_value:.2f}",
-                        )
-                        return new_route
+                    # Return immediately if we find an improvement, creating the new route once
+                    new_route = self.apply(route, v1=v1, v2=v2, insert_pos=insert_pos, inplace=False)
+                    self.route_eval.carry_edge_state(new_route, edge_state, *changes)
+                    self.logger.info(
+                        "First relocate improvement found at [%d:%d] to %d after %d evaluations: "
+                        "value reduced from %.2f to %.2f",
+                        v1, v2, insert_pos, evaluations, curr_value, new_value,
+                    )
+                    return new_route
 
-        self.logger.debug(f"No relocate improvement found after {evaluations} evaluations")
+        self.logger.debug("No relocate improvement found after %d evaluations", evaluations)
         return route
@@ -1,11 +1,55 @@
-from random import SystemRandom
+from typing import TYPE_CHECKING
+
+import numpy as np
 
 from eval.route_eval import RouteEvaluator
-from optimiser.iterative.operations.operation import Operation
+from optimiser.iterative.operations._kernels import NO_MOVE, best_3opt, scan_3opt
+from optimiser.iterative.operations.operation import IMPROVEMENT_TOLERANCE, Operation
 from schemas.route import Route
 from utils.logger import Logger
 
+if TYPE_CHECKING:
+    from optimiser.iterative.operations._cuda_kernels import CudaThreeOptSearch
+
 MIN_ROUTE_LENGTH = 6
+GPU_MIN_ROUTE_LENGTH = 200  # shorter routes are searched faster on the CPU than copied to the device
+
+# Middle segments of each reconnection type, between segments A and D, as (segment, reversed)
+RECONNECTION_SEGMENTS = (
+    (("b", False), ("c", False)),  # A-B-C-D
+    (("b", False), ("c", True)),  # A-B-revC-D
+    (("b", True), ("c", False)),  # A-revB-C-D
+    (("c", False), ("b", False)),  # A-C-B-D
+    (("b", True), ("c", True)),  # A-revB-revC-D
+    (("c", False), ("b", True)),  # A-C-revB-D
+    (("c", True), ("b", False)),  # A-revC-B-D
+    (("c", True), ("b", True)),  # A-revC-revB-D
+)
+
+# Edges of each reconnection type, as pairs of cut point endpoints:
+# 0: route[v1-1], 1: route[v1], 2: route[v2-1], 3: route[v2], 4: route[v3-1], 5: route[v3]
+RECONNECTION_EDGES = (
+    ((0, 1), (2, 3), (4, 5)),  # A-B-C-D
+    ((0, 1), (2, 4), (3, 5)),  # A-B-revC-D
+    ((0, 2), (1, 3), (4, 5)),  # A-revB-C-D
+    ((0, 3), (4, 1), (2, 5)),  # A-C-B-D
+    ((0, 2), (1, 4), (3, 5)),  # A-revB-revC-D
+    ((0, 3), (4, 2), (1, 5)),  # A-C-revB-D
+    ((0, 4), (3, 1), (2, 5)),  # A-revC-B-D
+    ((0, 4), (3, 2), (1, 5)),  # A-revC-revB-D
+)
+
+# The reconnection tables as arrays for the search kernel, with the reversal of segments B and C
+RECONNECTION_EDGE_ARRAY = np.array(RECONNECTION_EDGES, dtype=np.int64)
+RECONNECTION_REVERSED = np.array(
+    [[dict(segments)["b"], dict(segments)["c"]] for segments in RECONNECTION_SEGMENTS],
+    dtype=np.bool_,
+)
+
+# Order of the reconnection types tried by the search: all in order for the best improvement, and for the
+# first improvement the reversals that keep segments B and C in place (1, 2, 4) before those that exchange them
+RECONNECTION_ORDER = np.arange(1, 8, dtype=np.int64)
+FIRST_IMPROVEMENT_ORDER = np.array([1, 2, 4, 6, 3, 5, 7], dtype=np.int64)
 
 
 class ThreeOptSwap(Operation):
@@ -33,59 +77,44 @@ class ThreeOptSwap(Operation):
 
     logger: Logger
     rnd_seed: int
-    rnd_generator: SystemRandom
+    rnd_generator: np.random.Generator
     route_eval: RouteEvaluator
+    early_exit_frac: float | None
+    gpu_search: "CudaThreeOptSearch | None"
 
     def __init__(
             self,
             route_eval: RouteEvaluator,
             logger: Logger | None = None,
             rnd_seed: int = 42,
+            early_exit_frac: float | None = None,
+            *,
+            gpu: bool = False,
         ) -> None:
-        """Initialise the operation."""
+        """Initialise the operation.
+
+        With `early_exit_frac`, the best improvement is the best within the rows of the first cut point
+        scanned until one improves the route by at least this fraction of its objective value, which
+        trades some of its quality for the latency of first improvement on long routes.
+
+        With `gpu`, the best improvement of routes of at least GPU_MIN_ROUTE_LENGTH nodes is searched on
+        a CUDA device, when one is available, and on the CPU otherwise.
+        """
         self.route_eval = route_eval
+        self.early_exit_frac = early_exit_frac
         self.rnd_seed = rnd_seed
-        self.rnd_generator = SystemRandom(x=self.rnd_seed)
+        self.rnd_generator = np.random.default_rng(self.rnd_seed)
+        self._random_draws = iter(())
         self.logger = logger or Logger(__name__)
+        self.gpu_search = None
+        if gpu:
+            # numba.cuda is only imported when the GPU search is requested
+            from optimiser.iterative.operations import _cuda_kernels
 
-    def _get_all_reconnections(
-            self,
-            segment_a: list,
-            segment_b: list,
-            segment_c: list,
-            segment_d: list,
-        ) -> list[list]:
-        """Generate all possible 3-opt reconnections.
-
-        Args:
-            segment_a: First segment
-            segment_b: Second segment
-            segment_c: Third segment
-            segment_d: Fourth segment
-
-        Returns:
-            List of all possible reconnections
-
-        """
-        reconnections = [
-            # 1. Original (no change)
-            segment_a + segment_b + segment_c + segment_d,
-            # 2. Reverse C (2-opt on C)
-            segment_a + segment_b + list(reversed(segment_c)) + segment_d,
-            # 3. Reverse B (2-opt on B)
-            segment_a + list(reversed(segment_b)) + segment_c + segment_d,
-            # 4. Swap B and C
-            segment_a + segment_c + segment_b + segment_d,
-            # 5. Reverse both B and C
-            segment_a + list(reversed(segment_b)) + list(reversed(segment_c)) + segment_d,
-            # 6. Swap B and C, reverse B
-            segment_a + segment_c + list(reversed(segment_b)) + segment_d,
-            # 7. Swap B and C, reverse C
-            segment_a + list(reversed(segment_c)) + segment_b + segment_d,
-            # 8. Swap and reverse both B and C
-            segment_a + list(reversed(segment_c)) + list(reversed(segment_b)) + segment_d,
-        ]
-        return reconnections
+            if _cuda_kernels.is_available():
+                self.gpu_search = _cuda_kernels.CudaThreeOptSearch()
+            else:
+                self.logger.warning("No CUDA device available, the 3-opt search runs on the CPU")
 
     def apply(
             self,
@@ -111,7 +140,7 @@ class ThreeOptSwap(Operation):
             The modified route (either new or the same object if inplace=True)
 
         """
-        route_length = len(route.sequence)
+        route_length = len(route)
 
         # Need at least 6 nodes to perform 3-opt (start, 3 intermediate segments, end)
         if route_length < MIN_ROUTE_LENGTH:
@@ -121,9 +150,9 @@ class ThreeOptSwap(Operation):
         # Generate random indices if not provided
         # We exclude the first and last nodes (depot nodes)
         if v1 is None or v2 is None or v3 is None:
-            v1 = self.rnd_generator.randint(1, route_length - 5)
-            v2 = self.rnd_generator.randint(v1 + 1, route_length - 3)
-            v3 = self.rnd_generator.randint(v2 + 1, route_length - 2)
+            v1 = self.randint(1, route_length - 5)
+            v2 = self.randint(v1 + 1, route_length - 3)
+            v3 = self.randint(v2 + 1, route_length - 2)
         else:
             # Ensure v1 < v2 < v3
             indices = sorted([v1, v2, v3])
@@ -139,45 +168,126 @@ class ThreeOptSwap(Operation):
 
         # Select reconnection type (0-7)
         if reconnection_type is None:
-            reconnection_type = self.rnd_generator.randint(1, 7)  # Skip 0 (original)
+            reconnection_type = self.randint(1, 7)  # Skip 0 (original)
         elif not 0 <= reconnection_type <= 7:
             self.logger.error(f"Invalid reconnection_type: {reconnection_type}, must be 0-7")
             return route if inplace else route.copy()
 
-        self.logger.debug(
-            f"Applying 3-opt swap at indices [{v1}, {v2}, {v3}] "
-            f"with reconnection type {reconnection_type}",
-        )
+        if self.logger.is_enabled_for("DEBUG"):
+            self.logger.debug(
+                "Applying 3-opt swap at indices [%d, %d, %d] with reconnection type %d",
+                v1, v2, v3, reconnection_type,
+            )
 
-        # Extract segments
-        segment_a = route.sequence[:v1]
-        segment_b = route.sequence[v1:v2]
-        segment_c = route.sequence[v2:v3]
-        segment_d = route.sequence[v3:]
+        # Extract segments of node IDs
+        ids = route.ids
+        segments = {"b": ids[v1:v2], "c": ids[v2:v3]}
 
-        # Get all possible reconnections
-        all_reconnections = self._get_all_reconnections(
-            segment_a, segment_b, segment_c, segment_d,
-        )
-
-        # Select the desired reconnection
-        new_sequence = all_reconnections[reconnection_type]
+        # Reconnect the segments as the desired reconnection
+        new_ids = np.concatenate((
+            ids[:v1],
+            *(segments[name][::-1] if is_reversed else segments[name]
+              for name, is_reversed in RECONNECTION_SEGMENTS[reconnection_type]),
+            ids[v3:],
+        ))
 
         # Apply the change
+        nodes = self.route_eval.node_manager.nodes
         if inplace:
-            route.sequence = new_sequence
-            self.logger.debug(
-                f"Applied 3-opt swap in place at indices [{v1}, {v2}, {v3}] "
-                f"type {reconnection_type}",
-            )
+            route.assign_ids(new_ids, nodes)
+            if self.logger.is_enabled_for("DEBUG"):
+                self.logger.debug(
+                    "Applied 3-opt swap in place at indices [%d, %d, %d] type %d",
+                    v1, v2, v3, reconnection_type,
+                )
             return route
 
         # Create a new route
-        new_route = Route(name=route.name, sequence=new_sequence, logger=self.logger)
-        self.logger.debug(
-            f"Created new route with 3-opt swap at indices [{v1}, {v2}, {v3}] "
-            f"type {reconnection_type}",
+        new_route = Route.from_ids(name=route.name, ids=new_ids, nodes=nodes)
+        if self.logger.is_enabled_for("DEBUG"):
+            self.logger.debug(
+                "Created new route with 3-opt swap at indices [%d, %d, %d] type %d",
+                v1, v2, v3, reconnection_type,
+            )
+        return new_route
+
+    def changed_edges(
+            self,
+            route: Route,
+            v1: int,
+            v2: int,
+            v3: int,
+            reconnection_type: int,
+        ) -> tuple[list[tuple[int, int]], list[tuple[int, int]]]:
+        """Get the edges removed from and added to the route by the 3-opt swap.
+
+        Distances are symmetric, so the edges within the (reversed) segments are unchanged.
+        """
+        ids = route.ids
+        endpoints = (ids[v1 - 1], ids[v1], ids[v2 - 1], ids[v2], ids[v3 - 1], ids[v3])
+        removed = [(endpoints[i], endpoints[j]) for i, j in RECONNECTION_EDGES[0]]
+        added = [(endpoints[i], endpoints[j]) for i, j in RECONNECTION_EDGES[reconnection_type]]
+        return removed, added
+
+    def search(
+            self,
+            route: Route,
+            *,
+            only_valid: bool,
+            first: bool,
+        ) -> tuple[tuple[int, int, int, int] | None, float, int]:
+        """Search the best (or first) improving 3-opt swap of the route with the compiled kernel.
+
+        Returns:
+            The cut points and reconnection type of the swap (None if no improvement), its value,
+            and the number of swaps evaluated
+
+        """
+        edge_state = self.route_eval.edge_state(route)
+        curr_value = edge_state.objective_value
+        # A 3-opt swap keeps the depots and the nodes of the route, so unless the route already meets
+        # these constraints no swap can make it valid, and only the sequence constraints are checked
+        if only_valid and not self.route_eval.has_valid_structure(route):
+            return None, curr_value, 0
+
+        order = FIRST_IMPROVEMENT_ORDER if first else RECONNECTION_ORDER
+        args = (
+            route.ids,
+            edge_state.distance_matrix,
+            edge_state.l_value,
+            edge_state.total_distance,
+            curr_value,
+            IMPROVEMENT_TOLERANCE,
+            RECONNECTION_EDGE_ARRAY,
+            RECONNECTION_REVERSED,
+            order,
+            self.route_eval.get_forbidden_transitions(),
+            only_valid,
         )
+        if first:
+            v1, v2, v3, reconnection_type, new_value, evaluations = scan_3opt(*args, True, -np.inf)
+        elif self.early_exit_frac is not None:
+            exit_value = curr_value * (1.0 - self.early_exit_frac)
+            v1, v2, v3, reconnection_type, new_value, evaluations = scan_3opt(*args, False, exit_value)
+        elif self.gpu_search is not None and len(route) >= GPU_MIN_ROUTE_LENGTH:
+            v1, v2, v3, reconnection_type, new_value, evaluations = self.gpu_search.best_3opt(*args)
+        else:
+            # All rows are scanned, in parallel
+            v1, v2, v3, reconnection_type, new_value, evaluations = best_3opt(*args)
+        if v1 == NO_MOVE:
+            return None, curr_value, evaluations
+        return (v1, v2, v3, reconnection_type), new_value, evaluations
+
+    def apply_move(
+            self,
+            route: Route,
+            move: tuple[int, int, int, int],
+        ) -> Route:
+        """Create the route of a 3-opt swap found by `search`, keeping the edge state of the route."""
+        v1, v2, v3, reconnection_type = move
+        new_route = self.apply(route, v1=v1, v2=v2, v3=v3, reconnection_type=reconnection_type, inplace=False)
+        changes = self.changed_edges(route, v1=v1, v2=v2, v3=v3, reconnection_type=reconnection_type)
+        self.route_eval.carry_edge_state(new_route, self.route_eval.edge_state(route), *changes)
         return new_route
 
     def apply_best_improvement(
@@ -197,53 +307,17 @@ class ThreeOptSwap(Operation):
             The improved route (or original if no improvement found)
 
         """
-        best_route = route.copy()
-        orig_value = best_value = self.route_eval.calculate_objective_value(route)
-        improved = False
-
-        route_length = len(route.sequence)
-        evaluations = 0
-
-        # Try all possible 3-opt swaps
-        for v1 in range(1, route_length - 4):
-            for v2 in range(v1 + 1, route_length - 2):
-                for v3 in range(v2 + 1, route_length - 1):
-                    # Try all reconnection types (skip 0 which is original)
-                    for reconnection_type in range(1, 8):
-                        # Create new route with this swap
-                        new_route = self.apply(
-                            route,
-                            v1=v1,
-                            v2=v2,
-                            v3=v3,
-                            reconnection_type=reconnection_type,
-                            inplace=False,
-                        )
-                        if only_valid and not self.route_eval.is_valid_route(route=new_route):
-                            continue
-                        new_value = self.route_eval.calculate_objective_value(route=new_route)
-                        evaluations += 1
-
-                        # Check if this is an improvement
-                        if new_value < best_value:
-                            best_route = new_route
-                            best_value = new_value
-                            improved = True
-                            self.logger.debug(
-                                f"Found improvement with 3-opt [{v1}, {v2}, {v3}] "
-                                f"type {reconnection_type}: value reduced to {new_value:.2f}",
-                            )
-
-        if improved:
-            self.logger.info(
-                f"Best 3-opt improvement found after {evaluations} evaluations: "
-                f"value reduced from {orig_value:.2f} to {best_value:.2f}",
-            )
-        else:
-            self.logger.debug(
-                f"No 3-opt improvement found after {evaluations} evaluations",
-            )
-
+        orig_value = self.route_eval.edge_state(route).objective_value
+        move, best_value, evaluations = self.search(route, only_valid=only_valid, first=False)
+        if move is None:
+            self.logger.debug("No 3-opt improvement found after %d evaluations", evaluations)
+            return route.copy()
+
+        best_route = self.apply_move(route, move)
+        self.logger.info(
+            "Best 3-opt improvement found after %d evaluations: value reduced from %.2f to %.2f",
+            evaluations, orig_value, best_value,
+        )
         return best_route
 
     def apply_first_improvement(
@@ -254,7 +328,8 @@ class ThreeOptSwap(Operation):
         ) -> Route:
         """Apply the first 3-opt improvement found.
 
-        Stops as soon as an improvement is found (faster than best improvement).
+        Stops as soon as an improvement is found (faster than best improvement). For each cut points,
+        the reconnection types are tried in `FIRST_IMPROVEMENT_ORDER`, single segment reversals first.
 
         Args:
             route: The route to improve
@@ -263,38 +338,17 @@ class ThreeOptSwap(Operation):
             The improved route (or original if no improvement found)
 
         """
-        curr_value = self.route_eval.calculate_objective_value(route)
-        route_length = len(route.sequence)
-        evaluations = 0
-
-        # Try 3-opt swaps until we find an improvement
-        for v1 in range(1, route_length - 4):
-            for v2 in range(v1 + 1, route_length - 2):
-                for v3 in range(v2 + 1, route_length - 1):
-                    # Try all reconnection types (skip 0 which is original)
-                    for reconnection_type in range(1, 8):
-                        # Create new route with this swap
-                        new_route = self.apply(
-                            route,
-                            v1=v1,
-                            v2=v2,
-                            v3=v3,
-                            reconnection_type=reconnection_type,
-                            inplace=False,
-                        )
-                        if only_valid and not self.route_eval.is_valid_route(route=new_route):
-                            continue
-                        new_value = self.route_eval.calculate_objective_value(route=new_route)
-                        evaluations += 1
-
-                        # Return immediately if we find an improvement
-                        if new_value < curr_value:
-                            self.logger.info(
-                                f"First 3-opt improvement found at [{v1}, {v2}, {v3}] "
-                                f"type {reconnection_type} after {evaluations} evaluations: "
-                                f"value reduced from {curr_value:.2f} to {new_value:.2f}",
-                            )
-                            return new_route
-
-        self.logger.debug(f"No 3-opt improvement found after {evaluations} evaluations")
-        return route
+        curr_value = self.route_eval.edge_state(route).objective_value
+        move, new_value, evaluations = self.search(route, only_valid=only_valid, first=True)
+        if move is None:
+            self.logger.debug("No 3-opt improvement found after %d evaluations", evaluations)
+            return route
+
+        new_route = self.apply_move(route, move)
+        v1, v2, v3, reconnection_type = move
+        self.logger.info(
+            "First 3-opt improvement found at [%d, %d, %d] type %d after %d evaluations: "
+            "value reduced from %.2f to %.2f",
+            v1, v2, v3, reconnection_type, evaluations, curr_value, new_value,
+        )
+        return new_route
@@ -1,7 +1,7 @@
-from random import SystemRandom
+import numpy as np
 
-from eval.route_eval import RouteEvaluator
-from optimiser.iterative.operations.operation import Operation
+from eval.route_eval import RouteEdgeState, RouteEvaluator
+from optimiser.iterative.operations.operation import IMPROVEMENT_TOLERANCE, Operation
 from schemas.route import Route
 from utils.logger import Logger
 
@@ -23,7 +23,7 @@ class TwoOptSwap(Operation):
 
     logger: Logger
     rnd_seed: int
-    rnd_generator: SystemRandom
+    rnd_generator: np.random.Generator
     route_eval: RouteEvaluator
 
     def __init__(
@@ -35,7 +35,8 @@ class TwoOptSwap(Operation):
         """Initialise the operation."""
         self.route_eval = route_eval
         self.rnd_seed = rnd_seed
-        self.rnd_generator = SystemRandom(x=self.rnd_seed)
+        self.rnd_generator = np.random.default_rng(self.rnd_seed)
+        self._random_draws = iter(())
         self.logger = logger or Logger(__name__)
 
     def apply(
@@ -58,7 +59,7 @@ class TwoOptSwap(Operation):
             The modified route (either new or the same object if inplace=True)
 
         """
-        route_length = len(route.sequence)
+        route_length = len(route)
 
         # Need at least 4 nodes to perform 2-opt (start, 2 intermediate, end)
         if route_length < MIN_ROUTE_LENGTH:
@@ -68,8 +69,8 @@ class TwoOptSwap(Operation):
         # Generate random indices if not provided
         # We exclude the first and last nodes (depot nodes)
         if v1 is None or v2 is None:
-            v1 = self.rnd_generator.randint(1, route_length - 3)
-            v2 = self.rnd_generator.randint(v1 + 1, route_length - 2)
+            v1 = self.randint(1, route_length - 3)
+            v2 = self.randint(v1 + 1, route_length - 2)
         else:
             # Ensure v1 < v2
             if v1 > v2:
@@ -82,28 +83,107 @@ class TwoOptSwap(Operation):
                 )
                 return route if inplace else route.copy()
 
-        self.logger.debug(
-            f"Applying 2-opt swap: reversing segment between indices {v1} and {v2}",
-        )
+        if self.logger.is_enabled_for("DEBUG"):
+            self.logger.debug("Applying 2-opt swap: reversing segment between indices %d and %d", v1, v2)
 
-        # Perform the 2-opt swap
+        # Perform the 2-opt swap on the node IDs
+        ids = route.ids.copy()
+        ids[v1:v2 + 1] = ids[v1:v2 + 1][::-1]  # Reverse middle segment
+        nodes = self.route_eval.node_manager.nodes
         if inplace:
             # Reverse the segment in place
-            route.sequence[v1:v2 + 1] = reversed(route.sequence[v1:v2 + 1])
-            self.logger.debug(f"Applied 2-opt swap in place at indices [{v1}:{v2}]")
+            route.assign_ids(ids, nodes)
+            if self.logger.is_enabled_for("DEBUG"):
+                self.logger.debug("Applied 2-opt swap in place at indices [%d:%d]", v1, v2)
             return route
 
         # else: Create a new route with the reversed segment
-        new_sequence = (
-            route.sequence[:v1] +  # Keep first part as is
-            list(reversed(route.sequence[v1:v2 + 1])) +  # Reverse middle segment
-            route.sequence[v2 + 1:]  # Keep last part as is
+        new_route = Route.from_ids(name=route.name, ids=ids, nodes=nodes)
+        if self.logger.is_enabled_for("DEBUG"):
+            self.logger.debug("Created new route with 2-opt swap at indices [%d:%d]", v1, v2)
+        return new_route
+
+    def changed_edges(
+            self,
+            route: Route,
+            v1: int,
+            v2: int,
+        ) -> tuple[list[tuple[int, int]], list[tuple[int, int]]]:
+        """Get the edges removed from and added to the route by reversing the segment [v1:v2].
+
+        Distances are symmetric, so the reversed edges within the segment are unchanged.
+        """
+        ids = route.ids
+        removed = [(ids[v1 - 1], ids[v1]), (ids[v2], ids[v2 + 1])]
+        added = [(ids[v1 - 1], ids[v2]), (ids[v1], ids[v2 + 1])]
+        return removed, added
+
+    def swap_values(
+            self,
+            route: Route,
+            edge_state: RouteEdgeState,
+        ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Get the objective value after every 2-opt swap of the route at once.
+
+        A swap of [v1:v2] replaces the edges at positions (v1-1, v1) and (v2, v2+1) by (v1-1, v2) and
+        (v1, v2+1), so the new longest (shortest) edge is one of the added edges or one of the three
+        longest (shortest) edges of the route that is not removed.
+
+        Returns:
+            The v1 and v2 indices of all swaps, in the order of the nested loops, and their values
+
+        """
+        ids = route.ids
+        v1, v2 = np.triu_indices(len(ids) - 2, k=1)
+        v1 += 1
+        v2 += 1
+        if len(v1) == 0:
+            return v1, v2, np.empty(0)
+
+        route_matrix = self.route_eval.distance_manager.matrix_for(ids).astype(np.float64, copy=False)
+        edges = np.diagonal(route_matrix, offset=1)
+        removed = edges[v1 - 1] + edges[v2]
+        added_first = route_matrix[v1 - 1, v2]
+        added_second = route_matrix[v1, v2 + 1]
+
+        def kept_extreme(ranked: np.ndarray) -> np.ndarray:
+            # At most two of the three ranked edges are removed by a swap
+            kept = np.full(len(v1), edges[ranked[2]])
+            for k in (1, 0):
+                kept = np.where((v1 - 1 != ranked[k]) & (v2 != ranked[k]), edges[ranked[k]], kept)
+            return kept
+
+        ranked = np.argsort(edges, kind="stable")
+        max_distance = np.maximum(kept_extreme(ranked[::-1]), np.maximum(added_first, added_second))
+        min_distance = np.minimum(kept_extreme(ranked), np.minimum(added_first, added_second))
+        values = (
+            edge_state.l_value * (max_distance - min_distance)
+            + edge_state.total_distance - removed + (added_first + added_second)
         )
-        new_route = Route(name=route.name, sequence=new_sequence, logger=self.logger)
-        self.logger.debug(
-            f"Created new route with 2-opt swap at indices [{v1}:{v2}]",
+        return v1, v2, values
+
+    def valid_swaps(
+            self,
+            route: Route,
+            v1: np.ndarray,
+            v2: np.ndarray,
+        ) -> np.ndarray:
+        """Check which 2-opt swaps of the route meet the sequence constraints, at once.
+
+        A swap keeps the depots and the nodes of the route, so only the sequence constraints can change:
+        it replaces two transitions and reverses those in between, which are counted from prefix sums.
+        """
+        ids = route.ids
+        forbidden_transitions = self.route_eval.get_forbidden_transitions()
+        forward_sums = np.concatenate(([0], np.cumsum(forbidden_transitions[ids[:-1], ids[1:]])))
+        backward_sums = np.concatenate(([0], np.cumsum(forbidden_transitions[ids[1:], ids[:-1]])))
+        forbidden_count = (
+            forward_sums[v1 - 1] + forward_sums[-1] - forward_sums[v2 + 1]  # outside the segment
+            + backward_sums[v2] - backward_sums[v1]  # within the reversed segment
+            + forbidden_transitions[ids[v1 - 1], ids[v2]]
+            + forbidden_transitions[ids[v1], ids[v2 + 1]]
         )
-        return new_route
+        return forbidden_count == 0
 
     def apply_best_improvement(
             self,
@@ -113,7 +193,7 @@ class TwoOptSwap(Operation):
         ) -> Route:
         """Apply the best 2-opt improvement to the route.
 
-        Tries all possible 2-opt swaps and returns the one with the best improvement.
+        Evaluates all possible 2-opt swaps at once and returns the one with the best improvement.
 
         Args:
             route: The route to improve
@@ -122,39 +202,32 @@ class TwoOptSwap(Operation):
             The improved route (or original if no improvement found)
 
         """
-        best_route = route.copy()
-        orig_value = best_value = self.route_eval.calculate_objective_value(route)
-        improved = False
-
-        route_length = len(route.sequence)
-
-        # Try all possible 2-opt swaps
-        for v1 in range(1, route_length - 2):
-            for v2 in range(v1 + 1, route_length - 1):
-                # Create new route with this swap
-                new_route = self.apply(route, v1=v1, v2=v2, inplace=False)
-                if only_valid and not self.route_eval.is_valid_route(route=new_route):
-                    continue
-                new_value = self.route_eval.calculate_objective_value(route=new_route)
-
-                # Check if this is an improvement
-                if new_value < best_value:
-                    best_route = new_route
-                    best_value = new_value
-                    improved = True
-                    self.logger.debug(
-                        f"Found improvement with 2-opt [{v1}:{v2}]: "
-                        f"value reduced to {new_value:.2f}",
-                    )
-
-        if improved:
-            self.logger.info(
-                f"Best 2-opt improvement found: "
-                f"value reduced from {orig_value} to {best_value:.2f}",
-            )
-        else:
+        edge_state = self.route_eval.edge_state(route)
+        orig_value = edge_state.objective_value
+        v1, v2, values = self.swap_values(route, edge_state)
+
+        improving = values < orig_value - IMPROVEMENT_TOLERANCE
+        if only_valid and improving.any():
+            # The route level constraints are checked once, only the sequence constraints per swap
+            if self.route_eval.has_valid_structure(route):
+                improving &= self.valid_swaps(route, v1, v2)
+            else:
+                improving[:] = False
+
+        if not improving.any():
             self.logger.debug("No 2-opt improvement found")
-
+            return route.copy()
+
+        # Create the new route once, for the first of the best swaps, as the nested loops would find
+        best_value = values[improving].min()
+        best_move = int(np.argmax(improving & (values < best_value + IMPROVEMENT_TOLERANCE)))
+        best_v1, best_v2, best_value = int(v1[best_move]), int(v2[best_move]), float(values[best_move])
+        best_route = self.apply(route, v1=best_v1, v2=best_v2, inplace=False)
+        self.route_eval.carry_edge_state(best_route, edge_state, *self.changed_edges(route, v1=best_v1, v2=best_v2))
+        self.logger.info(
+            "Best 2-opt improvement found at [%d:%d]: value reduced from %s to %.2f",
+            best_v1, best_v2, orig_value, best_value,
+        )
         return best_route
 
     def apply_first_improvement(
@@ -165,7 +238,8 @@ class TwoOptSwap(Operation):
         ) -> Route:
         """Apply the first 2-opt improvement found.
 
-        Stops as soon as an improvement is found (faster than best improvement).
+        Evaluates all possible 2-opt swaps at once and takes the first improvement in the order of
+        the nested loops over v1 and v2.
 
         Args:
             route: The route to improve
@@ -174,25 +248,30 @@ class TwoOptSwap(Operation):
             The improved route (or original if no improvement found)
 
         """
-        curr_value = self.route_eval.calculate_objective_value(route)
-        route_length = len(route.sequence)
-
-        # Try 2-opt swaps until we find an improvement
-        for v1 in range(1, route_length - 2):
-            for v2 in range(v1 + 1, route_length - 1):
-                # Create new route with this swap
-                new_route = self.apply(route, v1=v1, v2=v2, inplace=False)
-                if only_valid and not self.route_eval.is_valid_route(route=new_route):
-                    continue
-                new_value = self.route_eval.calculate_objective_value(route=new_route)
-
-                # Return immediately if we find an improvement
-                if new_value < curr_value:
-                    self.logger.info(
-                        f"First 2-opt improvement found at [{v1}:{v2}]: "
-                        f"value reduced from {curr_value:.2f} to {new_value:.2f}",
-                    )
-                    return new_route
+        edge_state = self.route_eval.edge_state(route)
+        curr_value = edge_state.objective_value
+        v1, v2, values = self.swap_values(route, edge_state)
+
+        improving = values < curr_value - IMPROVEMENT_TOLERANCE
+        if only_valid and improving.any():
+            # The route level constraints are checked once, only the sequence constraints per swap
+            if self.route_eval.has_valid_structure(route):
+                improving &= self.valid_swaps(route, v1, v2)
+            else:
+                improving[:] = False
+
+        if improving.any():
+            # Create the new route once, for the first improving swap
+            k = int(np.argmax(improving))
+            first_v1, first_v2 = int(v1[k]), int(v2[k])
+            new_route = self.apply(route, v1=first_v1, v2=first_v2, inplace=False)
+            changes = self.changed_edges(route, v1=first_v1, v2=first_v2)
+            self.route_eval.carry_edge_state(new_route, edge_state, *changes)
+            self.logger.info(
+                "First 2-opt improvement found at [%d:%d]: value reduced from %.2f to %.2f",
+                first_v1, first_v2, curr_value, values[k],
+            )
+            return new_route
 
         self.logger.debug("No 2-opt improvement found")
         return route
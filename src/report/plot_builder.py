@@ -1,4 +1,9 @@
+import matplotlib
+
+matplotlib.use("Agg")  # plots are only saved to files, skip the GUI backend
+
 import matplotlib.pyplot as plt
+import numpy as np
 
 from schemas.node import Node
 from schemas.route import Route
@@ -63,11 +68,17 @@ class IterationPlotBuilder:
         plt.close()
 
 class RoutePlotBuilder:
-    """Builder class for plotting routes."""
+    """Builder class for plotting routes.
+
+    The figure, the nodes and their labels are drawn once, each route only updates the route line.
+    """
 
     logger: Logger
     figure: plt.Figure
+    ax: plt.Axes
     nodes: list[Node]
+    node_xy: np.ndarray
+    route_line: plt.Line2D
 
     def __init__(
             self,
@@ -76,8 +87,14 @@ class RoutePlotBuilder:
         ) -> None:
         """Initialize the PlotBuilder."""
         self.nodes = nodes
+        self.node_xy = np.array([(node.x, node.y) for node in nodes], dtype=np.float64).reshape(-1, 2)
         self.logger = logger or Logger(__name__)
-        self.figure = plt.figure(figsize=(10, 6))
+        self.figure, self.ax = plt.subplots(figsize=(10, 6))
+        self._plot_nodes()
+        (self.route_line,) = self.ax.plot([], [], color="red", marker="o")
+        self.ax.set_xlabel("X Coordinate")
+        self.ax.set_ylabel("Y Coordinate")
+        self.ax.grid()
 
     def route_to_file(
             self,
@@ -86,8 +103,6 @@ class RoutePlotBuilder:
             title: str | None = None,
         ) -> plt.Figure:
         """Rebuild the plot builder."""
-        self._clear_plot()
-        self._plot_nodes()
         self._plot_route(route=route)
         self._save_plot(
             filepath=filepath,
@@ -95,25 +110,19 @@ class RoutePlotBuilder:
         )
         return self
 
-    def _clear_plot(self) -> None:
-        """Clear the current plot."""
-        plt.clf()
-
     def _plot_nodes(self) -> None:
         """Plot the nodes."""
-        x_coords = [node.x for node in self.nodes]
-        y_coords = [node.y for node in self.nodes]
-
-        plt.scatter(x_coords, y_coords, color="blue")
-        for i, node in enumerate(self.nodes):
-            plt.text(node.x, node.y, str(node.id))
+        xy = self.node_xy
+        self.ax.scatter(xy[:, 0], xy[:, 1], color="blue")
+        for (x, y), node in zip(xy.tolist(), self.nodes):
+            self.ax.text(x, y, str(node.id))
 
     def _plot_route(self, route: Route) -> None:
-        """Plot the given route."""
-        x_coords = [node.x for node in route.sequence]
-        y_coords = [node.y for node in route.sequence]
-
-        plt.plot(x_coords, y_coords, color="red", marker="o")
+        """Plot the given route, replacing the previous one."""
+        xy = route.xy
+        self.route_line.set_data(xy[:, 0], xy[:, 1])
+        self.ax.relim()
+        self.ax.autoscale_view()
 
     def _save_plot(
             self,
@@ -122,9 +131,9 @@ class RoutePlotBuilder:
         ) -> None:
         """Save the plot to the specified filepath."""
         title = title or "Route Plot"
-        plt.title(title)
-        plt.xlabel("X Coordinate")
-        plt.ylabel("Y Coordinate")
-        plt.grid()
-        plt.savefig(filepath)
-        plt.close()
+        self.ax.set_title(title)
+        self.figure.savefig(filepath)
+
+    def close(self) -> None:
+        """Close the figure, once the last route has been saved."""
+        plt.close(self.figure)
@@ -13,8 +13,10 @@ class Node(BaseModel):
     def __hash__(self) -> int:
         """Make Node hashable for use in sets and dicts.
 
+        Node IDs are unique, so equal nodes have equal IDs and the coordinates add nothing to the hash.
+
         Returns:
-            Hash value based on node id, x, and y coordinates
+            Hash value based on node id
 
         """
-        return hash((self.id, self.x, self.y))
+        return self.id
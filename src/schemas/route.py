@@ -1,31 +1,110 @@
-from pydantic import BaseModel
+from collections.abc import Mapping
+from typing import Any
+
+import numpy as np
+from pydantic import BaseModel, PrivateAttr
 
 from schemas.node import Node
 
 
 class Route(BaseModel):
-    """A class representing a route consisting of multiple nodes."""
+    """A class representing a route consisting of multiple nodes.
+
+    The int32 array of node IDs, `ids`, is the state the operators and the evaluator work on; the Node objects
+    of `sequence` are resolved from it once per route, when the route is created from IDs.
+    """
 
     name: str
     sequence: list[Node]
 
+    _ids: np.ndarray | None = PrivateAttr(default=None)
+    _xy: np.ndarray | None = PrivateAttr(default=None)
+    _str: str | None = PrivateAttr(default=None)
+    # sorted edge distances of the sequence, kept by the RouteEvaluator for incremental evaluation
+    _edge_state: Any = PrivateAttr(default=None)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        """Set an attribute, dropping the cached node arrays, string and edge state when the sequence is replaced."""
+        super().__setattr__(name, value)
+        if name == "sequence":
+            self._ids = None
+            self._xy = None
+            self._str = None
+            self._edge_state = None
+
+    @classmethod
+    def from_ids(cls, name: str, ids: np.ndarray, nodes: Mapping[int, Node]) -> "Route":
+        """Create a route from node IDs, resolving the Node objects from `nodes` by ID.
+
+        See `assign_ids`, the sequence is not validated.
+        """
+        route = cls.model_construct(name=name, sequence=[])
+        route.assign_ids(ids, nodes)
+        return route
+
+    def assign_ids(self, ids: np.ndarray, nodes: Mapping[int, Node]) -> None:
+        """Replace the sequence by the nodes with the given IDs, resolved from `nodes` by ID.
+
+        The int32 array is adopted as the cached node IDs and made read-only, so operators can build
+        new routes with array slicing and only resolve the Node objects once.
+        """
+        ids = np.asarray(ids, dtype=np.int32)
+        self.sequence = [nodes[node_id] for node_id in ids.tolist()]
+        ids.flags.writeable = False
+        self._ids = ids
+
+    @property
+    def ids(self) -> np.ndarray:
+        """Get the node IDs of the sequence as a read-only int32 array.
+
+        Cached until the sequence is reassigned; mutating `sequence` in place does not refresh it.
+        """
+        if self._ids is None:
+            ids = np.fromiter((node.id for node in self.sequence), dtype=np.int32, count=len(self.sequence))
+            ids.flags.writeable = False
+            self._ids = ids
+        return self._ids
+
+    @property
+    def xy(self) -> np.ndarray:
+        """Get the (n, 2) coordinates of the sequence as a read-only float64 array.
+
+        Cached like `ids`, for plotting and export without an attribute lookup per node.
+        """
+        if self._xy is None:
+            xy = np.array([(node.x, node.y) for node in self.sequence], dtype=np.float64).reshape(-1, 2)
+            xy.flags.writeable = False
+            self._xy = xy
+        return self._xy
+
     def __str__(self) -> str:
         """Get the route as a string representation.
 
+        Cached like `ids`.
+
         Returns:
             String in format "0-3-1-2-4-5"
 
         """
-        return "-".join([str(node.id) for node in self.sequence])
+        if self._str is None:
+            self._str = "-".join(map(str, self.ids.tolist()))
+        return self._str
 
     def __repr__(self) -> str:
         """Representation the route as a string."""
-        return f"Route({self.__str__()})"
+        return f"Route({self})"
 
     def __len__(self) -> int:
         """Return the number of nodes in the route."""
         return len(self.sequence)
 
     def copy(self) -> "Route":
-        """Create a deep copy of the route."""
-        return Route(name=self.name, sequence=self.sequence.copy())
+        """Create a deep copy of the route.
+
+        The nodes are already validated, so the copy is constructed without validating them again.
+        """
+        new_route = Route.model_construct(name=self.name, sequence=self.sequence.copy())
+        new_route._ids = self._ids
+        new_route._xy = self._xy
+        new_route._str = self._str
+        return new_route
@@ -0,0 +1,328 @@
+"""File handlers of the logging module, imported only when logging to a file."""
+
+import codecs
+import copy
+import functools
+import io
+import locale
+import logging
+import os
+import queue
+import stat
+import sys
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import ClassVar
+
+__all__ = [
+    "_BatchQueueListener",
+    "_FastRotatingFileHandler",
+    "_IoUringRotatingFileHandler",
+    "_RecordQueueHandler",
+    "io_uring_available",
+]
+
+IO_URING_ENTRIES = 32  # writes in flight on the ring of a log file
+
+
+@functools.cache
+def io_uring_available() -> bool:
+    """Check if log files can be written through io_uring, on Linux with the liburing bindings installed.
+
+    A ring is set up once, as containers may block io_uring even where the kernel supports it.
+    """
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        import liburing
+    except ImportError:
+        return False
+    ring = liburing.Ring()
+    try:
+        liburing.io_uring_queue_init(1, ring)
+    except OSError:
+        return False
+    liburing.io_uring_queue_exit(ring)
+    return True
+
+
+class _FastRotatingFileHandler(RotatingFileHandler):
+    """Rotating file handler that buffers its writes and counts the size of the file itself.
+
+    The stream is flushed after records of `flush_level` and above, and when the file is rotated or closed,
+    instead of after every record. The size and type of the file are taken once from the open file and the
+    size is then counted per record, so records are neither formatted again, nor the path looked up, nor the
+    file seeked to its end, as in the stock rollover check.
+
+    The file is written in binary mode, so each record is encoded once, by the formatter itself if it has
+    a `format_bytes` method for the UTF-8 encoding, and not again by a text stream.
+    """
+
+    buffer_size: ClassVar[int] = 64 * 1024
+    flush_level: ClassVar[int] = logging.WARNING
+
+    _bytes_written: int | None = None
+    _regular_file: bool = True
+    _encoding: str = "utf-8"
+    _terminator_bytes: bytes = b"\n"
+
+    def _open(self) -> io.BufferedWriter:
+        """Open the log file in binary mode, and take its size and type from the open file."""
+        encoding = locale.getencoding() if self.encoding == "locale" else self.encoding or "utf-8"
+        self._encoding = codecs.lookup(encoding).name
+        self._terminator_bytes = self.terminator.encode(self._encoding)
+        stream = self._open_binary()
+        file_stat = os.fstat(stream.fileno())
+        self._bytes_written = file_stat.st_size
+        self._regular_file = stat.S_ISREG(file_stat.st_mode)
+        return stream
+
+    def _open_binary(self) -> io.BufferedWriter:
+        """Open the log file in binary mode with a buffer of `buffer_size` bytes."""
+        return open(self.baseFilename, self.mode + "b", buffering=self.buffer_size)
+
+    def _encode(self, record: logging.LogRecord) -> bytes:
+        """Format the record as bytes in the encoding of the handler."""
+        format_bytes = getattr(self.formatter, "format_bytes", None)
+        if format_bytes is not None and self._encoding == "utf-8":
+            return format_bytes(record)
+        return self.format(record).encode(self._encoding, self.errors or "strict")
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Write the record, rotating the file first if it would not fit."""
+        self.emit_batch([record])
+
+    def handle_batch(self, records: list[logging.LogRecord]) -> None:
+        """Write the records that pass the filters of the handler, as `handle` does for a single record."""
+        filtered = []
+        for record in records:
+            result = self.filter(record)
+            if isinstance(result, logging.LogRecord):
+                record = result  # a filter may return a replacement of the record
+            if result:
+                filtered.append(record)
+        if filtered:
+            with self.lock:
+                self.emit_batch(filtered)
+
+    def emit_batch(self, records: list[logging.LogRecord]) -> None:
+        """Write the records in a single write, rotating the file first for each record that would not fit.
+
+        The stream is flushed once after the records, if any of them is of `flush_level` or above.
+        """
+        chunks: list[bytes] = []
+        flush = False
+        for record in records:
+            try:
+                if self.stream is None and (self.mode != "w" or not self._closed):
+                    self.stream = self._open()
+                data = self._encode(record)
+                size = len(data) + len(self._terminator_bytes)
+                # Never rotate an empty file, nor anything other than a regular file, as the stock check
+                if (
+                    self.maxBytes > 0
+                    and self._bytes_written
+                    and self._bytes_written + size >= self.maxBytes
+                    and self._regular_file
+                ):
+                    self._write(chunks)
+                    self.doRollover()
+                    if self.stream is None and (self.mode != "w" or not self._closed):
+                        self.stream = self._open()  # with delay, the rollover leaves the new file closed
+                if self.stream is None:
+                    continue
+                chunks.append(data)
+                chunks.append(self._terminator_bytes)
+                self._bytes_written += size
+                flush = flush or record.levelno >= self.flush_level
+            except RecursionError:
+                raise
+            except Exception:
+                self.handleError(record)
+        try:
+            self._write(chunks)
+            if flush:
+                self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(records[-1])
+
+    def _write(self, chunks: list[bytes]) -> None:
+        """Write the chunks of records to the stream at once, and clear them."""
+        if chunks:
+            self.stream.write(b"".join(chunks))
+            chunks.clear()
+
+
+class _IoUringFile:
+    """Binary file appended to through io_uring, with the stream methods the file handlers use.
+
+    Writes are copied into a buffer of `buffer_size` bytes, which is submitted as a single write at its
+    offset in the file when full. The submission queue is polled by a kernel thread when the kernel allows
+    it, so a submission is usually not a system call. Completions are only waited for when the file is
+    flushed, after which all its writes have completed, as after the flush of a regular file.
+    """
+
+    def __init__(self, filename: str, mode: str, buffer_size: int) -> None:
+        """Open the file, at its end unless the mode truncates it."""
+        import liburing
+
+        self._liburing = liburing
+        self.name = filename
+        self._buffer_size = buffer_size
+        self._buffer = bytearray()
+        self._pending: dict[int, tuple[bytes, int]] = {}  # user data of the writes in flight: data, offset
+        self._next_key = 0
+        flags = os.O_WRONLY | os.O_CREAT | os.O_CLOEXEC | (os.O_TRUNC if "w" in mode else 0)
+        # Not O_APPEND, the writes are positioned so that they may complete in any order
+        self._fd = os.open(filename, flags, 0o644)
+        self._offset = os.fstat(self._fd).st_size
+        self._ring = liburing.Ring()
+        self._cqe = liburing.Cqe()
+        try:
+            liburing.io_uring_queue_init(IO_URING_ENTRIES, self._ring, liburing.IORING_SETUP_SQPOLL)
+        except OSError:  # polling may need privileges
+            liburing.io_uring_queue_init(IO_URING_ENTRIES, self._ring)
+
+    def write(self, data: bytes) -> int:
+        """Copy the data into the buffer, submitting the buffer when full."""
+        self._buffer += data
+        if len(self._buffer) >= self._buffer_size:
+            self._submit_buffer()
+        return len(data)
+
+    def fileno(self) -> int:
+        """Get the file descriptor of the file."""
+        return self._fd
+
+    def tell(self) -> int:
+        """Get the size of the file, including the buffered bytes."""
+        return self._offset + len(self._buffer)
+
+    def flush(self) -> None:
+        """Submit the buffer and wait for all the writes in flight."""
+        self._submit_buffer()
+        while self._pending:
+            self._reap()
+
+    def close(self) -> None:
+        """Flush and close the file."""
+        if self._fd < 0:
+            return
+        try:
+            self.flush()
+        finally:
+            self._liburing.io_uring_queue_exit(self._ring)
+            os.close(self._fd)
+            self._fd = -1
+
+    def _submit_buffer(self) -> None:
+        """Submit the buffered bytes as a write at the end of the file."""
+        if self._buffer:
+            data = bytes(self._buffer)
+            self._buffer.clear()
+            self._submit(data, self._offset)
+            self._offset += len(data)
+
+    def _submit(self, data: bytes, offset: int) -> None:
+        """Submit a write of the data at the offset, keeping the data until the write completes."""
+        liburing = self._liburing
+        while liburing.io_uring_cq_ready(self._ring):
+            self._reap()
+        while len(self._pending) >= IO_URING_ENTRIES:
+            self._reap()
+        sqe = liburing.io_uring_get_sqe(self._ring)
+        liburing.io_uring_prep_write(sqe, self._fd, data, offset)
+        liburing.io_uring_sqe_set_data64(sqe, self._next_key)
+        self._pending[self._next_key] = (data, offset)
+        self._next_key += 1
+        liburing.io_uring_submit(self._ring)
+
+    def _reap(self) -> None:
+        """Wait for the next completed write, submitting the rest of the data again if it was written partly."""
+        liburing = self._liburing
+        liburing.io_uring_wait_cqe(self._ring, self._cqe)
+        cqe = self._cqe[0]
+        data, offset = self._pending.pop(cqe.user_data)
+        try:
+            written = cqe.res  # raises the error of a failed write
+        finally:
+            liburing.io_uring_cqe_seen(self._ring, cqe)
+        if written < len(data):
+            self._submit(data[written:], offset + written)
+
+
+class _IoUringRotatingFileHandler(_FastRotatingFileHandler):
+    """Rotating file handler of `_FastRotatingFileHandler` that writes its buffer through io_uring.
+
+    It writes on the listener thread of the file, so the logging threads neither format nor write records.
+    """
+
+    def _open_binary(self) -> _IoUringFile:
+        """Open the log file on a ring with a buffer of `buffer_size` bytes."""
+        return _IoUringFile(self.baseFilename, self.mode, self.buffer_size)
+
+
+class _BatchQueueListener(QueueListener):
+    """Queue listener that dequeues the records already queued in batches of up to `batch_size` records.
+
+    The records of a batch are handed together to the handlers with a `handle_batch` method, so that
+    records logged in a burst are written, and flushed, at once, and one by one to the other handlers.
+    """
+
+    batch_size: ClassVar[int] = 256
+
+    def _monitor(self) -> None:
+        """Handle the queued records in batches, until the sentinel is dequeued."""
+        q = self.queue
+        has_task_done = hasattr(q, "task_done")
+        while True:
+            # Block for the first record of a batch only, the batch ends when the queue is empty
+            batch = [self.dequeue(True)]
+            try:
+                while len(batch) < self.batch_size and batch[-1] is not self._sentinel:
+                    batch.append(self.dequeue(False))
+            except queue.Empty:
+                pass
+            stop = batch[-1] is self._sentinel
+            if stop:
+                batch.pop()
+            if batch:
+                self.handle_batch(batch)
+            if has_task_done:
+                for _ in range(len(batch) + stop):
+                    q.task_done()
+            if stop:
+                break
+
+    def handle_batch(self, records: list[logging.LogRecord]) -> None:
+        """Hand the records to the handlers, as `handle` does for a single record."""
+        records = [self.prepare(record) for record in records]
+        for handler in self.handlers:
+            if self.respect_handler_level:
+                processed = [record for record in records if record.levelno >= handler.level]
+            else:
+                processed = records
+            if not processed:
+                continue
+            handle_batch = getattr(handler, "handle_batch", None)
+            if handle_batch is not None:
+                handle_batch(processed)
+            else:
+                for record in processed:
+                    handler.handle(record)
+
+
+class _RecordQueueHandler(QueueHandler):
+    """Queue handler that enqueues the records themselves, for a listener in the same process.
+
+    The message is merged with its arguments, which may change after the call, but the record is
+    formatted by the handlers of the listener, so the exception info is kept for their formatters.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Get a copy of the record with its message merged with its arguments."""
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
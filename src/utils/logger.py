@@ -1,11 +1,14 @@
 """Logging module."""
 
+import atexit
 import json
 import logging
 import sys
-from datetime import datetime
-from logging.handlers import RotatingFileHandler
-from pathlib import Path
+import threading
+import time
+from collections.abc import Callable, Mapping
+from json.encoder import encode_basestring_ascii
+from types import MappingProxyType
 from typing import Any, ClassVar, Literal
 
 
@@ -21,14 +24,15 @@ class Logger:
     - Thread-safe operations
     """
 
-    # Log level mapping
-    LEVELS: ClassVar = {
+    # Log level mapping, read-only, and its reverse
+    LEVELS: ClassVar[Mapping[str, int]] = MappingProxyType({
         "DEBUG": logging.DEBUG,
         "INFO": logging.INFO,
         "WARNING": logging.WARNING,
         "ERROR": logging.ERROR,
         "CRITICAL": logging.CRITICAL,
-    }
+    })
+    LEVEL_NAMES: ClassVar[Mapping[int, str]] = MappingProxyType({num: name for name, num in LEVELS.items()})
 
     def __init__(
         self,
@@ -41,6 +45,8 @@ class Logger:
         max_bytes: int = 10485760,  # 10MB
         backup_count: int = 5,
         date_format: str = "%Y-%m-%d %H:%M:%S",
+        io_uring_output: bool = False,
+        fast_json: bool = True,
     ) -> None:
         """Initialize the logger.
 
@@ -53,15 +59,23 @@ class Logger:
             max_bytes: Maximum size of log file before rotation
             backup_count: Number of backup files to keep
             date_format: Date format for log messages
+            io_uring_output: Write the log file through io_uring, on Linux with the liburing extra installed
+            fast_json: Serialise JSON records with orjson or ujson when installed, see `JsonFormatter`
 
         """
         self.logger = logging.getLogger(name)
         self.logger.setLevel(self.LEVELS.get(level.upper(), logging.INFO))
+        # The level is cached, so that messages below it return before any call into logging
+        self._level_num = self.logger.level
         self.logger.propagate = False
         self.json_format = json_format
         self.date_format = date_format
+        self.fast_json = fast_json
+        # One formatter is shared by the handlers, formatters only read their configuration when formatting
+        self._formatter = self._get_formatter()
 
         # Remove existing handlers
+        self._stop_listeners()
         self.logger.handlers.clear()
 
         # Add console handler
@@ -70,80 +84,163 @@ class Logger:
 
         # Add file handler
         if file_output:
-            self._add_file_handler(file_output, max_bytes, backup_count)
+            self._add_file_handler(file_output, max_bytes, backup_count, io_uring_output=io_uring_output)
 
     def _add_console_handler(self) -> None:
         """Add console handler for stdout output."""
         console_handler = logging.StreamHandler(sys.stdout)
         console_handler.setLevel(self.logger.level)
-        console_handler.setFormatter(self._get_formatter())
+        console_handler.setFormatter(self._formatter)
         self.logger.addHandler(console_handler)
 
-    def _add_file_handler(self, filepath: str, max_bytes: int, backup_count: int) -> None:
-        """Add rotating file handler."""
+    def _add_file_handler(
+            self,
+            filepath: str,
+            max_bytes: int,
+            backup_count: int,
+            *,
+            io_uring_output: bool = False,
+        ) -> None:
+        """Add rotating file handler, writing through io_uring if requested and available."""
+        # The file handlers, and the modules they depend on, are only imported when logging to a file
+        import queue
+        from pathlib import Path
+
+        from utils._file_handlers import (
+            _BatchQueueListener,
+            _FastRotatingFileHandler,
+            _IoUringRotatingFileHandler,
+            _RecordQueueHandler,
+            io_uring_available,
+        )
+
         # Ensure directory exists
         Path(filepath).parent.mkdir(parents=True, exist_ok=True)
 
-        file_handler = RotatingFileHandler(
+        handler_class = (
+            _IoUringRotatingFileHandler if io_uring_output and io_uring_available() else _FastRotatingFileHandler
+        )
+        file_handler = handler_class(
             filepath,
             maxBytes=max_bytes,
             backupCount=backup_count,
             encoding="utf-8",
         )
         file_handler.setLevel(self.logger.level)
-        file_handler.setFormatter(self._get_formatter())
-        self.logger.addHandler(file_handler)
+        file_handler.setFormatter(self._formatter)
+
+        # Records are formatted and written in batches on the listener thread, the logging thread only enqueues them
+        queue_handler = _RecordQueueHandler(queue.SimpleQueue())
+        queue_handler.setLevel(self.logger.level)
+        queue_handler.listener = _BatchQueueListener(
+            queue_handler.queue, file_handler, respect_handler_level=True,
+        )
+        queue_handler.listener.start()
+        atexit.register(queue_handler.listener.stop)
+        self.logger.addHandler(queue_handler)
+
+    def _stop_listeners(self) -> None:
+        """Stop the queue listeners of the file handlers, writing the records still queued."""
+        for handler in self.logger.handlers:
+            listener = getattr(handler, "listener", None)
+            if listener is not None:
+                atexit.unregister(listener.stop)
+                listener.stop()
+                handler.listener = None  # a listener can only be stopped once
+                for queued_handler in listener.handlers:
+                    queued_handler.close()
+
+    def close(self) -> None:
+        """Write the queued records and close the handlers."""
+        self._stop_listeners()
+        for handler in self.logger.handlers:
+            handler.close()
 
     def _get_formatter(self) -> logging.Formatter:
         """Get appropriate formatter based on configuration."""
         if self.json_format:
-            return JsonFormatter(self.date_format)
+            return JsonFormatter(self.date_format, fast_json=self.fast_json)
         format_string = (
             "%(asctime)s - %(name)s - %(levelname)s - "
             "%(filename)s:%(lineno)d - %(message)s"
         )
-        return logging.Formatter(format_string, datefmt=self.date_format)
-
-    def debug(self, message: str, **kwargs) -> None:
-        """Log debug message."""
-        self.logger.debug(message, extra=kwargs)
-
-    def info(self, message: str, **kwargs) -> None:
-        """Log info message."""
-        self.logger.info(message, extra=kwargs)
-
-    def warning(self, message: str, **kwargs) -> None:
-        """Log warning message."""
-        self.logger.warning(message, extra=kwargs)
-
-    def error(self, message: str, exc_info: bool = False, **kwargs) -> None:
+        return TextFormatter(format_string, self.date_format)
+
+    def debug(self, message: str, /, *args, **kwargs) -> None:
+        """Log debug message, %-style args are only formatted when the message is emitted."""
+        if self._level_num <= logging.DEBUG:
+            if kwargs:
+                self.logger.debug(message, *args, extra=kwargs)
+            else:
+                self.logger.debug(message, *args)
+
+    def info(self, message: str, /, *args, **kwargs) -> None:
+        """Log info message, %-style args are only formatted when the message is emitted."""
+        if self._level_num <= logging.INFO:
+            if kwargs:
+                self.logger.info(message, *args, extra=kwargs)
+            else:
+                self.logger.info(message, *args)
+
+    def warning(self, message: str, /, *args, **kwargs) -> None:
+        """Log warning message, %-style args are only formatted when the message is emitted."""
+        if self._level_num <= logging.WARNING:
+            if kwargs:
+                self.logger.warning(message, *args, extra=kwargs)
+            else:
+                self.logger.warning(message, *args)
+
+    def error(self, message: str, /, *args, exc_info: bool = False, **kwargs) -> None:
         """Log error message."""
-        self.logger.error(message, exc_info=exc_info, extra=kwargs)
+        if self._level_num <= logging.ERROR:
+            if kwargs:
+                self.logger.error(message, *args, exc_info=exc_info, extra=kwargs)
+            else:
+                self.logger.error(message, *args, exc_info=exc_info)
 
-    def critical(self, message: str, exc_info: bool = False, **kwargs) -> None:
+    def critical(self, message: str, /, *args, exc_info: bool = False, **kwargs) -> None:
         """Log critical message."""
-        self.logger.critical(message, exc_info=exc_info, extra=kwargs)
+        if self._level_num <= logging.CRITICAL:
+            if kwargs:
+                self.logger.critical(message, *args, exc_info=exc_info, extra=kwargs)
+            else:
+                self.logger.critical(message, *args, exc_info=exc_info)
 
-    def exception(self, message: str, **kwargs) -> None:
+    def exception(self, message: str, /, *args, **kwargs) -> None:
         """Log exception with traceback."""
-        self.logger.exception(message, extra=kwargs)
+        if self._level_num <= logging.ERROR:
+            if kwargs:
+                self.logger.exception(message, *args, extra=kwargs)
+            else:
+                self.logger.exception(message, *args)
+
+    def is_enabled_for(
+            self,
+            level: Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+        ) -> bool:
+        """Check if messages of the given level would be logged, to guard expensive log arguments."""
+        return self._level_num <= self.LEVELS[level.upper()]
 
     def set_level(
             self,
             level: Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
         ) -> None:
         """Change the logging level dynamically."""
-        if level.upper() not in self.LEVELS:
+        level_name = level.upper()
+        new_level = self.LEVELS.get(level_name)
+        if new_level is None:
             available = ", ".join(self.LEVELS.keys())
             msg = f"Invalid log level '{level}'. Must be one of: {available}"
             raise ValueError(msg)
 
-        new_level = self.LEVELS[level.upper()]
         self.logger.setLevel(new_level)
+        self._level_num = new_level
         for handler in self.logger.handlers:
             handler.setLevel(new_level)
+            for queued_handler in getattr(getattr(handler, "listener", None), "handlers", ()):
+                queued_handler.setLevel(new_level)
 
-        self.info(f"Log level changed to {level.upper()}")
+        self.info("Log level changed to %s", level_name)
 
     def get_level(self) -> str:
         """Get the current logging level.
@@ -152,11 +249,7 @@ class Logger:
             Current log level as string (e.g., 'INFO', 'DEBUG')
 
         """
-        level_num = self.logger.level
-        for name, num in self.LEVELS.items():
-            if num == level_num:
-                return name
-        return "NOTSET"
+        return self.LEVEL_NAMES.get(self.logger.level, "NOTSET")
 
     @property
     def level(self) -> str:
@@ -178,63 +271,269 @@ class Logger:
         return LoggerContext(self, context)
 
 
+def _fast_dumps() -> Callable[[Any], str] | None:
+    """Get a JSON serialiser written in C, from orjson or ujson, or None if neither is installed.
+
+    They are imported when the first JSON formatter is created, not with this module.
+    """
+    orjson_dumps_bytes = _fast_dumps_bytes()
+    if orjson_dumps_bytes is not None:
+        def orjson_dumps(obj: Any) -> str:
+            return orjson_dumps_bytes(obj).decode("utf-8")
+        return orjson_dumps
+
+    try:
+        import ujson
+    except ImportError:
+        return None
+
+    def ujson_dumps(obj: Any) -> str:
+        return ujson.dumps(obj, ensure_ascii=True, escape_forward_slashes=False)
+    return ujson_dumps
+
+
+def _fast_dumps_bytes() -> Callable[[Any], bytes] | None:
+    """Get the orjson serialiser to UTF-8 encoded JSON, or None if orjson is not installed."""
+    try:
+        import orjson
+    except ImportError:
+        return None
+
+    def orjson_dumps_bytes(obj: Any) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return orjson_dumps_bytes
+
+
+def _split_microseconds(date_format: str) -> list[str]:
+    """Split a date format at its microsecond directives (%f), leaving escaped percent signs (%%) in the parts."""
+    parts = []
+    start = k = 0
+    while k < len(date_format) - 1:
+        if date_format[k] != "%":
+            k += 1
+        elif date_format[k + 1] == "f":
+            parts.append(date_format[start:k])
+            start = k = k + 2
+        else:
+            k += 2  # a directive or an escaped percent sign, which cannot start another directive
+    parts.append(date_format[start:])
+    return parts
+
+
+# Keys of the fields of every JSON log record, in order, and the JSON that precedes the value of each
+RECORD_FIELDS = ("timestamp", "level", "logger", "message", "module", "function", "line")
+FIELD_PREFIXES = tuple(("{" if k == 0 else ", ") + json.dumps(key) + ": " for k, key in enumerate(RECORD_FIELDS))
+EXCEPTION_PREFIX = ", " + json.dumps("exception") + ": "
+RESERVED_KEYS = frozenset((*RECORD_FIELDS, "exception"))
+
+
 class JsonFormatter(logging.Formatter):
-    """Custom JSON formatter for structured logging."""
+    """Custom JSON formatter for structured logging.
+
+    With `fast_json` and orjson or ujson installed (the `orjson` and `ujson` extras), records are
+    serialised by them, which differs from the standard json module: the JSON is compact, without spaces
+    after the separators, and orjson does not escape non-ASCII characters and writes NaN and infinities
+    as null. Records they cannot serialise, such as extra fields with non-str keys in orjson, fall back
+    to the standard json module. Without `fast_json`, the output is the same on every installation.
+    """
 
-    def __init__(self, date_format: str):
+    def __init__(self, date_format: str, *, fast_json: bool = True):
         super().__init__()
         self.date_format = date_format
+        self._fast_dumps = _fast_dumps() if fast_json else None
+        self._fast_dumps_bytes = _fast_dumps_bytes() if fast_json else None
+        # Apart from the microseconds (%f), the timestamp changes at most once per second,
+        # so the parts of the format around them are formatted once per second
+        self._second_formats = _split_microseconds(date_format)
+        # A naive datetime formats the time zone tokens as empty strings, unlike time.strftime
+        self._naive_time_zone = "%z" in date_format or "%Z" in date_format
+        # The second and its parts are replaced together, as the formatter is shared with the file listener thread
+        self._cached_parts: tuple[int | None, list[str]] = (None, [])
+
+    def format_timestamp(self, created: float) -> str:
+        """Format the creation time of a record, reusing the parts formatted for the same second."""
+        second = int(created)
+        # Rounded to the microsecond as datetime.fromtimestamp does
+        microsecond = round((created - second) * 1_000_000)
+        if microsecond >= 1_000_000:
+            second += 1
+            microsecond -= 1_000_000
+        cached_second, parts = self._cached_parts
+        if second != cached_second:
+            if self._naive_time_zone:
+                from datetime import datetime
+
+                moment = datetime.fromtimestamp(second)
+                parts = [moment.strftime(part) for part in self._second_formats]
+            else:
+                local_time = self.converter(second)
+                parts = [time.strftime(part, local_time) for part in self._second_formats]
+            self._cached_parts = (second, parts)
+        if len(parts) == 1:
+            return parts[0]
+        return f"{microsecond:06d}".join(parts)
 
     def format(self, record: logging.LogRecord) -> str:
-        """Format log record as JSON."""
-        log_data = {
-            "timestamp": datetime.fromtimestamp(record.created).strftime(self.date_format),
-            "level": record.levelname,
-            "logger": record.name,
-            "message": record.getMessage(),
-            "module": record.module,
-            "function": record.funcName,
-            "line": record.lineno,
-        }
+        """Format log record as JSON.
 
-        # Add exception info if present
+        With orjson or ujson, the fields are serialised as a dict in a single call, in their compact form.
+        With the standard json, the keys and separators are joined as precomputed JSON, so only the values
+        are encoded per record, with the same output as json.dumps of the record fields.
+
+        The JSON is cached on the record with the date format, so the formatters of other handlers of the
+        record with the same date format, including those on the listener thread of the file, reuse it.
+        """
+        cached_json = record.__dict__.get("_cached_json")
+        if cached_json is not None and cached_json[0] == self.date_format:
+            return cached_json[1]
+        formatted = self._format(record)
+        record._cached_json = (self.date_format, formatted)
+        return formatted
+
+    def format_bytes(self, record: logging.LogRecord) -> bytes:
+        """Format log record as UTF-8 encoded JSON, for the file handlers writing bytes.
+
+        With orjson, a record not formatted yet is serialised to bytes, without the decoding of `format`
+        and the encoding of its string by the handler.
+        """
+        cached_json = record.__dict__.get("_cached_json")
+        if self._fast_dumps_bytes is not None and (cached_json is None or cached_json[0] != self.date_format):
+            try:
+                return self._fast_dumps_bytes(self._record_data(record, self._record_values(record)))
+            except TypeError:
+                pass  # fields orjson rejects are serialised by `format`, with the standard json
+        return self.format(record).encode("utf-8")
+
+    def _record_values(self, record: logging.LogRecord) -> tuple[Any, ...]:
+        """Get the values of the record fields, in the order of `RECORD_FIELDS`."""
+        return (
+            self.format_timestamp(record.created),
+            record.levelname,
+            record.name,
+            record.getMessage(),
+            record.module,
+            record.funcName,
+            record.lineno,
+        )
+
+    def _record_data(self, record: logging.LogRecord, values: tuple[Any, ...]) -> dict[str, Any]:
+        """Get the fields of the record as a dict, followed by the exception and the extra fields."""
+        log_data = dict(zip(RECORD_FIELDS, values, strict=True))
         if record.exc_info:
             log_data["exception"] = self.formatException(record.exc_info)
+        extra_fields = getattr(record, "extra_fields", None)
+        if extra_fields:
+            log_data.update(extra_fields)
+        return log_data
+
+    def _format(self, record: logging.LogRecord) -> str:
+        """Format log record as JSON, see `format`."""
+        values = self._record_values(record)
+        extra_fields = getattr(record, "extra_fields", None)
+        # Extra fields that replace record fields keep their position, as in a dict update
+        if self._fast_dumps is not None or (
+            extra_fields and not extra_fields.keys().isdisjoint(RESERVED_KEYS)
+        ):
+            log_data = self._record_data(record, values)
+            if self._fast_dumps is not None:
+                try:
+                    return self._fast_dumps(log_data)
+                except TypeError:
+                    pass  # e.g. non-str keys in orjson, or integers beyond 64 bits
+            return json.dumps(log_data)
+
+        parts = []
+        for prefix, value in zip(FIELD_PREFIXES, values, strict=True):
+            parts.append(prefix)
+            parts.append(encode_basestring_ascii(value) if isinstance(value, str) else json.dumps(value))
 
-        # Add extra fields
-        if hasattr(record, "extra_fields"):
-            log_data.update(record.extra_fields)
+        # Add exception info if present
+        if record.exc_info:
+            parts.append(EXCEPTION_PREFIX)
+            parts.append(encode_basestring_ascii(self.formatException(record.exc_info)))
 
-        return json.dumps(log_data)
+        # Add extra fields, as the members of their JSON object
+        if extra_fields:
+            parts.append(", ")
+            parts.append(json.dumps(extra_fields)[1:-1])
+
+        parts.append("}")
+        return "".join(parts)
+
+
+class TextFormatter(logging.Formatter):
+    """Text formatter that formats the time of records once per second, as the JSON formatter does."""
+
+    def __init__(self, fmt: str, date_format: str) -> None:
+        super().__init__(fmt, datefmt=date_format)
+        # The second and its formatted time are replaced together, as for the JSON formatter
+        self._cached_time: tuple[int | None, str] = (None, "")
+
+    def formatTime(self, record: logging.LogRecord, datefmt: str | None = None) -> str:
+        """Format the creation time of a record, reusing the time formatted for the same second."""
+        if datefmt is None or datefmt != self.datefmt:
+            return super().formatTime(record, datefmt)
+        second = int(record.created)  # the struct_time of the converter has whole seconds
+        cached_second, formatted = self._cached_time
+        if second != cached_second:
+            formatted = time.strftime(datefmt, self.converter(record.created))
+            self._cached_time = (second, formatted)
+        return formatted
 
 
 class LoggerContext:
-    """Context manager for adding contextual information to logs."""
+    """Context manager for adding contextual information to logs.
+
+    The contexts entered in a thread are kept on a stack of that thread, which the record factory
+    installed by this module merges into the extra fields of the records created in the thread.
+    """
+
+    __slots__ = ("context", "logger")
 
     def __init__(self, logger: Logger, context: dict[str, Any]) -> None:
         """Initialize the context manager."""
         self.logger = logger
         self.context = context
-        self.old_factory = None
 
     def __enter__(self) -> "LoggerContext":
         """Enter context and add context data to log records."""
-        self.old_factory = logging.getLogRecordFactory()
-
-        def record_factory(*args, **kwargs) -> logging.LogRecord:
-            record = self.old_factory(*args, **kwargs)
-            if not hasattr(record, "extra_fields"):
-                record.extra_fields = {}
-            record.extra_fields.update(self.context)
-            return record
-
-        logging.setLogRecordFactory(record_factory)
+        _context_stack().append(self.context)
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb) -> None:
-        """Exit context and restore original factory."""
-        if self.old_factory:
-            logging.setLogRecordFactory(self.old_factory)
+        """Exit context and stop adding its data to log records."""
+        _context_stack().pop()
+
+
+_thread_context = threading.local()
+
+
+def _context_stack() -> list[dict[str, Any]]:
+    """Get the stack of the contexts entered in the current thread, innermost last."""
+    try:
+        return _thread_context.stack
+    except AttributeError:
+        _thread_context.stack = []
+        return _thread_context.stack
+
+
+_base_record_factory = logging.getLogRecordFactory()
+
+
+def _record_factory(*args, **kwargs) -> logging.LogRecord:
+    """Create a log record with the contexts of the current thread in its extra fields."""
+    record = _base_record_factory(*args, **kwargs)
+    stack = getattr(_thread_context, "stack", None)
+    if stack:
+        if not hasattr(record, "extra_fields"):
+            record.extra_fields = {}
+        for context in stack:
+            record.extra_fields.update(context)
+    return record
+
+
+# A single factory for all contexts, instead of one installed per context
+logging.setLogRecordFactory(_record_factory)
 
 
 # Example usage
@@ -0,0 +1,49 @@
+from itertools import pairwise, permutations
+
+import numpy as np
+import pytest
+
+from src.schemas.node import Node
+
+
+def _shortest_path_reference(distance_matrix: np.ndarray) -> float:
+    n = distance_matrix.shape[0]
+    return min(
+        sum(float(distance_matrix[i, j]) for i, j in pairwise((0, *intermediate, n - 1)))
+        for intermediate in permutations(range(1, n - 1))
+    )
+
+
+@pytest.mark.parametrize(("nb_of_nodes", "seed", "coincident"), [
+    (2, 0, 0), (3, 1, 0), (4, 2, 1), (5, 3, 2), (6, 4, 2), (7, 5, 0), (7, 6, 3),
+])
+def test_lower_bound_below_shortest_path(make_instance, random_nodes, nb_of_nodes: int, seed: int, coincident: int):
+    from src.bounds.lower_bound import LowerBoundCalculator
+    instance = make_instance(random_nodes(nb_of_nodes, seed, coincident=coincident))
+    lower_bound = LowerBoundCalculator(logger=instance.route_eval.logger).calculate_lower_bound(
+        node_manager=instance.node_manager,
+        distance_manager=instance.distance_manager,
+    )
+    assert lower_bound <= _shortest_path_reference(instance.distance_manager.matrix()) + 1e-9
+
+
+def test_lower_bound_with_all_nodes_coincident(make_instance):
+    from src.bounds.lower_bound import LowerBoundCalculator
+    instance = make_instance([Node(id=i, x=1.0, y=1.0) for i in range(5)])
+    lower_bound = LowerBoundCalculator(logger=instance.route_eval.logger).calculate_lower_bound(
+        node_manager=instance.node_manager,
+        distance_manager=instance.distance_manager,
+    )
+    assert lower_bound == 0.0
+
+
+def test_lower_bound_is_tight_on_a_line(make_instance):
+    from src.bounds.lower_bound import LowerBoundCalculator
+    # The shortest path visits the nodes in order along the line, and is a minimum spanning tree
+    xs = [0.0, 1.0, 1.0, 2.5, 4.0, 7.0]
+    instance = make_instance([Node(id=i, x=x, y=0.0) for i, x in enumerate(xs)])
+    lower_bound = LowerBoundCalculator(logger=instance.route_eval.logger).calculate_lower_bound(
+        node_manager=instance.node_manager,
+        distance_manager=instance.distance_manager,
+    )
+    assert lower_bound == pytest.approx(_shortest_path_reference(instance.distance_manager.matrix()))
@@ -0,0 +1,61 @@
+from collections.abc import Callable
+from dataclasses import dataclass
+
+import numpy as np
+import pytest
+
+from src.schemas.node import Node
+
+
+@dataclass
+class Instance:
+    """A small instance with its managers and route evaluator."""
+
+    nodes: list[Node]
+    node_manager: object
+    edge_manager: object
+    distance_manager: object
+    route_eval: object
+
+
+@pytest.fixture
+def random_nodes() -> Callable[..., list[Node]]:
+    """Get n seeded nodes with integer coordinates on a small grid, the last `coincident` ones on earlier nodes."""
+
+    def generate(n: int, seed: int, coincident: int = 2) -> list[Node]:
+        rng = np.random.default_rng(seed)
+        xy = rng.integers(0, 20, size=(n, 2)).astype(np.float64)
+        for k in range(1, coincident + 1):
+            xy[-k] = xy[rng.integers(0, n - coincident)]
+        return [Node(id=i, x=float(x), y=float(y)) for i, (x, y) in enumerate(xy)]
+
+    return generate
+
+
+@pytest.fixture
+def make_instance() -> Callable[[list[Node]], Instance]:
+    """Build the managers and route evaluator of an instance from its nodes."""
+    from src.datastore.distance_manager import EuclidianDistanceManager
+    from src.datastore.edge_manager import EdgeManager
+    from src.datastore.node_manager import NodeManager
+    from src.eval.route_eval import RouteEvaluator
+    from src.utils.logger import Logger
+
+    def build(nodes: list[Node]) -> Instance:
+        logger = Logger("tests", level="CRITICAL")
+        node_mngr = NodeManager(logger=logger)
+        edge_mngr = EdgeManager(logger=logger)
+        for node in nodes:
+            node_mngr.add_node(node)
+            edge_mngr.add_node(node)
+        distance_mngr = EuclidianDistanceManager(nb_of_nodes=len(nodes), logger=logger)
+        distance_mngr.precompute(node_mngr.coords, node_mngr.iids)
+        route_eval = RouteEvaluator(
+            node_manager=node_mngr,
+            edge_manager=edge_mngr,
+            distance_manager=distance_mngr,
+            logger=logger,
+        )
+        return Instance(nodes, node_mngr, edge_mngr, distance_mngr, route_eval)
+
+    return build
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+
+def _nodes(coords: np.ndarray) -> list:
+    from src.schemas.node import Node
+    return [Node(id=k, x=float(x), y=float(y)) for k, (x, y) in enumerate(coords)]
+
+
+def _distance_matrix_reference(coords: np.ndarray) -> np.ndarray:
+    from src.datastore.distance_manager import EuclidianDistanceManager
+    nodes = _nodes(coords)
+    return np.array([[EuclidianDistanceManager.calculate_distance(a, b) for b in nodes] for a in nodes])
+
+
+COORDS = [
+    # coincident points, and distances of 0.15, 0.25, 0.35, 0.45 and 2.5 that round at .x5
+    [(0.0, 0.0), (0.0, 0.0), (0.15, 0.0), (0.25, 0.0), (0.35, 0.0), (0.45, 0.0), (1.5, 2.0), (0.15, 0.2)],
+    # the same points far from the origin
+    [(x + 1e6, y - 1e6) for x, y in
+     [(0.0, 0.0), (0.0, 0.0), (0.15, 0.0), (0.25, 0.0), (0.35, 0.0), (0.45, 0.0), (1.5, 2.0), (0.15, 0.2)]],
+    [(x * 0.05, y * 0.05) for x in range(-5, 6) for y in range(-5, 6)],
+    np.random.default_rng(0).uniform(-1e4, 1e4, size=(50, 2)).round(2).tolist(),
+]
+
+
+@pytest.mark.parametrize(("coords"), COORDS)
+def test_calculate_distance_matrix(coords: list[tuple[float, float]]):
+    from src.datastore.distance_manager import EuclidianDistanceManager
+    coords = np.array(coords, dtype=np.float64)
+    distance_matrix = EuclidianDistanceManager.calculate_distance_matrix(coords)
+    np.testing.assert_array_equal(distance_matrix, _distance_matrix_reference(coords))
+
+
+@pytest.mark.parametrize(("coords"), COORDS)
+def test_calculate_distances(coords: list[tuple[float, float]]):
+    from src.datastore.distance_manager import EuclidianDistanceManager
+    coords = np.array(coords, dtype=np.float64)
+    i, j = np.triu_indices(len(coords))
+    distances = EuclidianDistanceManager.calculate_distances(coords[i], coords[j])
+    np.testing.assert_array_equal(distances, _distance_matrix_reference(coords)[i, j])
+
+
+def test_get_distance_does_not_depend_on_precompute():
+    from src.datastore.distance_manager import EuclidianDistanceManager
+    coords = np.array(COORDS[0])
+    nodes = _nodes(coords)
+    precomputed = EuclidianDistanceManager(nb_of_nodes=len(nodes))
+    precomputed.precompute(coords, np.arange(len(nodes)))
+    # One node more, so that no distance from the last node back to the depot is preset to zero
+    on_demand = EuclidianDistanceManager(nb_of_nodes=len(nodes) + 1)
+    for a in nodes:
+        for b in nodes:
+            assert precomputed.get_distance(a, b) == on_demand.get_distance(a, b)
+    assert precomputed.get_distance(nodes[0], nodes[4]) == 0.3
+
+
+@pytest.mark.parametrize(("ids"), [[0, 1, 3], [1, 2, 3], [0, 1, 1], [0, 2, 2]])
+def test_precompute_rejects_non_contiguous_ids(ids: list[int]):
+    from src.datastore.distance_manager import EuclidianDistanceManager
+    distance_mngr = EuclidianDistanceManager(nb_of_nodes=len(ids))
+    with pytest.raises(ValueError, match="contiguous"):
+        distance_mngr.precompute(np.zeros((len(ids), 2)), np.array(ids))
+
+
+def test_precompute_sorts_rows_by_id():
+    from src.datastore.distance_manager import EuclidianDistanceManager
+    coords = np.array([(0.0, 0.0), (3.0, 4.0), (6.0, 8.0)])
+    ids = np.array([2, 0, 1])
+    distance_mngr = EuclidianDistanceManager(nb_of_nodes=len(ids))
+    distance_matrix = distance_mngr.precompute(coords, ids)
+    np.testing.assert_array_equal(distance_matrix, _distance_matrix_reference(coords[np.argsort(ids)]))
+    assert distance_mngr.l_value == 10.0
@@ -0,0 +1,27 @@
+import pytest
+
+from src.schemas.node import Node
+
+
+def _is_edge_valid_reference(id_from: int, id_to: int, n: int) -> bool:
+    if id_from == 0 or id_to == 0:
+        return True
+    if id_from == n - 1:
+        return id_to == 0
+    if id_from % 2 == 0 and id_to % 2 == 1 and id_from < n / 2:
+        return False
+    return not (id_from % 2 == 1 and id_to % 2 == 0 and id_from >= n / 2)
+
+
+@pytest.mark.parametrize(("nodes"), [
+    [Node(id=i, x=i * 1.0, y=i * 1.0) for i in range(n)] for n in (2, 7, 10)
+])
+def test_is_edge_valid(nodes: list[Node]):
+    from src.datastore.edge_manager import EdgeManager
+    edge_mngr = EdgeManager()
+    for node in nodes:
+        edge_mngr.add_node(node)
+    for node_from in nodes:
+        for node_to in nodes:
+            expected = _is_edge_valid_reference(node_from.id, node_to.id, len(nodes))
+            assert edge_mngr.is_edge_valid(node_from, node_to) == expected
@@ -0,0 +1,103 @@
+import os
+
+import numpy as np
+import pytest
+
+TOLERANCE = 1e-6
+
+
+def _kernel_args(route_length: int, seed: int, *, nb_of_distances: int, check_constraints: bool) -> tuple:
+    from src.optimiser.iterative.operations.three_opt_swap import RECONNECTION_EDGE_ARRAY, RECONNECTION_REVERSED
+    rng = np.random.default_rng(seed)
+    # Few distinct distances, so that many swaps tie and the order of the scan decides the swap found
+    distance_matrix = rng.integers(1, nb_of_distances + 1, size=(route_length, route_length)).astype(np.float64)
+    distance_matrix = np.triu(distance_matrix, 1) + np.triu(distance_matrix, 1).T
+    forbidden_transitions = rng.random((route_length, route_length)) < 0.1
+    np.fill_diagonal(forbidden_transitions, False)
+    ids = rng.permutation(route_length).astype(np.int32)
+    edges = distance_matrix[ids[:-1], ids[1:]]
+    l_value = 0.5
+    total_distance = float(edges.sum())
+    current_value = l_value * float(edges.max() - edges.min()) + total_distance
+    return (
+        ids, distance_matrix, l_value, total_distance, current_value, TOLERANCE,
+        RECONNECTION_EDGE_ARRAY, RECONNECTION_REVERSED, None, forbidden_transitions, check_constraints,
+    )
+
+
+def _with_order(args: tuple, order: np.ndarray) -> tuple:
+    return (*args[:8], order, *args[9:])
+
+
+@pytest.mark.parametrize("check_constraints", [False, True])
+@pytest.mark.parametrize("nb_of_distances", [1, 2, 3, 50])
+@pytest.mark.parametrize(("route_length", "seed"), [(5, 0), (6, 1), (9, 2), (16, 3), (40, 4)])
+def test_best_3opt_matches_sequential_scan(route_length: int, seed: int, nb_of_distances: int, check_constraints: bool):
+    from src.optimiser.iterative.operations._kernels import best_3opt, scan_3opt
+    from src.optimiser.iterative.operations.three_opt_swap import RECONNECTION_ORDER
+    args = _with_order(
+        _kernel_args(route_length, seed, nb_of_distances=nb_of_distances, check_constraints=check_constraints),
+        RECONNECTION_ORDER,
+    )
+    assert best_3opt(*args) == scan_3opt(*args, False, -np.inf)
+
+
+def _scan_reference(args: tuple, *, first: bool) -> tuple[int, int, int, int, float]:
+    from src.optimiser.iterative.operations._kernels import NO_MOVE
+    from src.optimiser.iterative.operations.three_opt_swap import RECONNECTION_SEGMENTS
+    ids, distance_matrix, l_value, _, current_value, _, _, _, order, forbidden_transitions, check_constraints = args
+    best, best_value = (NO_MOVE, NO_MOVE, NO_MOVE, 0), current_value
+    for v1 in range(1, len(ids) - 4):
+        for v2 in range(v1 + 1, len(ids) - 2):
+            for v3 in range(v2 + 1, len(ids) - 1):
+                segments = {"b": ids[v1:v2], "c": ids[v2:v3]}
+                for reconnection_type in order:
+                    new_ids = np.concatenate((
+                        ids[:v1],
+                        *(segments[name][::-1] if is_reversed else segments[name]
+                          for name, is_reversed in RECONNECTION_SEGMENTS[reconnection_type]),
+                        ids[v3:],
+                    ))
+                    if check_constraints and forbidden_transitions[new_ids[:-1], new_ids[1:]].any():
+                        continue
+                    edges = distance_matrix[new_ids[:-1], new_ids[1:]]
+                    new_value = l_value * float(edges.max() - edges.min()) + float(edges.sum())
+                    if new_value < best_value - TOLERANCE:
+                        best, best_value = (v1, v2, v3, int(reconnection_type)), new_value
+                        if first:
+                            return (*best, best_value)
+    return (*best, best_value)
+
+
+@pytest.mark.parametrize("first", [False, True])
+@pytest.mark.parametrize("check_constraints", [False, True])
+@pytest.mark.parametrize("nb_of_distances", [2, 50])
+@pytest.mark.parametrize(("route_length", "seed"), [(6, 5), (9, 6), (14, 7)])
+def test_scan_3opt_matches_reference(
+        route_length: int, seed: int, nb_of_distances: int, check_constraints: bool, first: bool,
+):
+    from src.optimiser.iterative.operations._kernels import scan_3opt
+    from src.optimiser.iterative.operations.three_opt_swap import FIRST_IMPROVEMENT_ORDER, RECONNECTION_ORDER
+    args = _with_order(
+        _kernel_args(route_length, seed, nb_of_distances=nb_of_distances, check_constraints=check_constraints),
+        FIRST_IMPROVEMENT_ORDER if first else RECONNECTION_ORDER,
+    )
+    *move, new_value, _ = scan_3opt(*args, first, -np.inf)
+    *expected_move, expected_value = _scan_reference(args, first=first)
+    assert move == expected_move
+    assert new_value == pytest.approx(expected_value)
+
+
+@pytest.mark.skipif(not os.getenv("NUMBA_ENABLE_CUDASIM"), reason="set NUMBA_ENABLE_CUDASIM=1 to run on the simulator")
+@pytest.mark.parametrize("check_constraints", [False, True])
+@pytest.mark.parametrize("nb_of_distances", [2, 50])
+@pytest.mark.parametrize(("route_length", "seed"), [(5, 8), (7, 9), (12, 10), (22, 11)])
+def test_cuda_best_3opt_matches_cpu(route_length: int, seed: int, nb_of_distances: int, check_constraints: bool):
+    from src.optimiser.iterative.operations._cuda_kernels import CudaThreeOptSearch
+    from src.optimiser.iterative.operations._kernels import best_3opt
+    from src.optimiser.iterative.operations.three_opt_swap import RECONNECTION_ORDER
+    args = _with_order(
+        _kernel_args(route_length, seed, nb_of_distances=nb_of_distances, check_constraints=check_constraints),
+        RECONNECTION_ORDER,
+    )
+    assert CudaThreeOptSearch().best_3opt(*args) == best_3opt(*args)
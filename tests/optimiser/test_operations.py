@@ -0,0 +1,168 @@
+import math
+from collections.abc import Iterator
+from itertools import combinations, pairwise
+
+import numpy as np
+import pytest
+
+from src.schemas.node import Node
+
+TOLERANCE = 1e-6
+THREE_OPT_BEST_ORDER = (1, 2, 3, 4, 5, 6, 7)
+THREE_OPT_FIRST_ORDER = (1, 2, 4, 6, 3, 5, 7)
+
+
+def _distance_reference(node_from: Node, node_to: Node) -> float:
+    return round(math.hypot(node_from.x - node_to.x, node_from.y - node_to.y), 1)
+
+
+def _objective_reference(nodes: list[Node], ids: list[int]) -> float:
+    edges = [_distance_reference(nodes[i], nodes[j]) for i, j in pairwise(ids)]
+    max_distance = max(_distance_reference(a, b) for a, b in combinations(nodes, 2))
+    l_value = max_distance * (len(nodes) - 2)
+    return l_value * (max(edges) - min(edges)) + sum(edges)
+
+
+def _is_valid_route_reference(ids: list[int], nb_of_nodes: int) -> bool:
+    n = nb_of_nodes - 2
+    if ids[0] != 0 or ids[-1] != n + 1 or sorted(ids[1:-1]) != list(range(1, n + 1)):
+        return False
+    for i, j in pairwise(ids):
+        if i in {0, n + 1} or j in {0, n + 1}:
+            continue
+        if i % 2 == 0 and j % 2 == 1 and i < n / 2:
+            return False
+        if i % 2 == 1 and j % 2 == 0 and i >= n / 2:
+            return False
+    return True
+
+
+def _two_opt_neighbours(ids: list[int]) -> Iterator[list[int]]:
+    for v1 in range(1, len(ids) - 2):
+        for v2 in range(v1 + 1, len(ids) - 1):
+            yield ids[:v1] + ids[v1:v2 + 1][::-1] + ids[v2 + 1:]
+
+
+def _relocate_neighbours(ids: list[int]) -> Iterator[list[int]]:
+    for v1 in range(1, len(ids) - 2):
+        for v2 in range(v1, len(ids) - 2):
+            segment = ids[v1:v2 + 1]
+            remaining = ids[:v1] + ids[v2 + 1:]
+            for insert_pos in range(len(ids) - len(segment)):
+                if v1 <= insert_pos <= v2 + 1:
+                    continue
+                position = insert_pos if insert_pos < v1 else insert_pos - len(segment)
+                yield remaining[:position] + segment + remaining[position:]
+
+
+def _three_opt_neighbours(ids: list[int], order: tuple[int, ...]) -> Iterator[list[int]]:
+    for v1 in range(1, len(ids) - 4):
+        for v2 in range(v1 + 1, len(ids) - 2):
+            for v3 in range(v2 + 1, len(ids) - 1):
+                a, b, c, d = ids[:v1], ids[v1:v2], ids[v2:v3], ids[v3:]
+                reconnections = {
+                    1: b + c[::-1], 2: b[::-1] + c, 3: c + b, 4: b[::-1] + c[::-1],
+                    5: c + b[::-1], 6: c[::-1] + b, 7: c[::-1] + b[::-1],
+                }
+                for reconnection_type in order:
+                    yield a + reconnections[reconnection_type] + d
+
+
+def _search_reference(
+        nodes: list[Node],
+        ids: list[int],
+        neighbours: Iterator[list[int]],
+        *,
+        first: bool,
+        only_valid: bool,
+) -> list[int]:
+    best_ids = ids
+    best_value = current_value = _objective_reference(nodes, ids)
+    for new_ids in neighbours:
+        if only_valid and not _is_valid_route_reference(new_ids, len(nodes)):
+            continue
+        new_value = _objective_reference(nodes, new_ids)
+        if first:
+            if new_value < current_value - TOLERANCE:
+                return new_ids
+        elif new_value < best_value - TOLERANCE:
+            best_ids, best_value = new_ids, new_value
+    return best_ids
+
+
+def _neighbours(operation_name: str, ids: list[int], *, first: bool) -> Iterator[list[int]]:
+    if operation_name == "two_opt":
+        return _two_opt_neighbours(ids)
+    if operation_name == "relocate":
+        return _relocate_neighbours(ids)
+    return _three_opt_neighbours(ids, THREE_OPT_FIRST_ORDER if first else THREE_OPT_BEST_ORDER)
+
+
+def _operation(operation_name: str, route_eval):
+    from src.optimiser.iterative.operations.relocate import Relocate
+    from src.optimiser.iterative.operations.three_opt_swap import ThreeOptSwap
+    from src.optimiser.iterative.operations.two_opt_swap import TwoOptSwap
+    operation_class = {"two_opt": TwoOptSwap, "relocate": Relocate, "three_opt": ThreeOptSwap}[operation_name]
+    return operation_class(route_eval=route_eval, logger=route_eval.logger)
+
+
+def _routes(nb_of_nodes: int, seed: int) -> list[list[int]]:
+    rng = np.random.default_rng(seed)
+    intermediate = list(range(1, nb_of_nodes - 1))
+    shuffled = rng.permutation(intermediate).tolist()
+    structurally_invalid = rng.permutation(nb_of_nodes).tolist()
+    if structurally_invalid[0] == 0:
+        structurally_invalid = structurally_invalid[::-1]
+    return [
+        [0, *intermediate, nb_of_nodes - 1],
+        [0, *shuffled, nb_of_nodes - 1],
+        structurally_invalid,
+    ]
+
+
+@pytest.mark.parametrize("operation_name", ["two_opt", "relocate", "three_opt"])
+@pytest.mark.parametrize("first", [False, True])
+@pytest.mark.parametrize("only_valid", [False, True])
+@pytest.mark.parametrize(("nb_of_nodes", "seed"), [(7, 0), (8, 1), (9, 2), (10, 4), (10, 5), (11, 6)])
+def test_improvement_matches_reference(
+        make_instance, random_nodes, operation_name: str, first: bool, only_valid: bool, nb_of_nodes: int, seed: int,
+):
+    from src.schemas.route import Route
+    nodes = random_nodes(nb_of_nodes, seed)
+    instance = make_instance(nodes)
+    operation = _operation(operation_name, instance.route_eval)
+    apply_improvement = operation.apply_first_improvement if first else operation.apply_best_improvement
+    for ids in _routes(nb_of_nodes, seed):
+        route = Route.from_ids(name="test", ids=np.array(ids), nodes=instance.node_manager.nodes)
+        # Up to the local optimum, so that the edge state carried to the improved route is evaluated too
+        for _ in range(10):
+            expected = _search_reference(
+                nodes, ids, _neighbours(operation_name, ids, first=first), first=first, only_valid=only_valid,
+            )
+            route = apply_improvement(route, only_valid=only_valid)
+            assert route.ids.tolist() == expected
+            assert instance.route_eval.calculate_objective_value(route) == pytest.approx(
+                _objective_reference(nodes, expected),
+            )
+            if expected == ids:
+                break
+            ids = expected
+
+
+@pytest.mark.parametrize("operation_name", ["two_opt", "relocate", "three_opt"])
+@pytest.mark.parametrize("first", [False, True])
+def test_improvement_with_coincident_nodes(make_instance, operation_name: str, first: bool):
+    from src.schemas.route import Route
+    # Every node is on one of three points, so most moves tie with the route or with each other
+    points = [(0.0, 0.0), (3.0, 4.0), (6.0, 0.0)]
+    nodes = [Node(id=i, x=points[i % 3][0], y=points[i % 3][1]) for i in range(9)]
+    instance = make_instance(nodes)
+    operation = _operation(operation_name, instance.route_eval)
+    apply_improvement = operation.apply_first_improvement if first else operation.apply_best_improvement
+    for only_valid in (False, True):
+        ids = list(range(9))
+        route = Route.from_ids(name="test", ids=np.array(ids), nodes=instance.node_manager.nodes)
+        expected = _search_reference(
+            nodes, ids, _neighbours(operation_name, ids, first=first), first=first, only_valid=only_valid,
+        )
+        assert apply_improvement(route, only_valid=only_valid).ids.tolist() == expected
@@ -0,0 +1,106 @@
+import logging
+from pathlib import Path
+
+import pytest
+
+MAX_BYTES = 200
+BACKUP_COUNT = 100
+
+
+def _messages(count: int) -> list[str]:
+    # Lengths up to beyond the maximum size of a file, so that some records do not fit any file
+    return [f"record {k} " + "x" * (k * 37 % (MAX_BYTES + 50)) for k in range(count)]
+
+
+def _records(messages: list[str]) -> list[logging.LogRecord]:
+    return [logging.makeLogRecord({"msg": message, "levelno": logging.INFO}) for message in messages]
+
+
+def _log_files(filepath: Path) -> list[Path]:
+    """Get the log file and its backups, from the oldest to the newest."""
+    backups = sorted(filepath.parent.glob(filepath.name + ".*"), key=lambda path: int(path.suffix[1:]), reverse=True)
+    return [*backups, filepath]
+
+
+def _check_rotated(filepath: Path, messages: list[str], line_prefix: str = "") -> None:
+    files = _log_files(filepath)
+    lines = [line for path in files for line in path.read_text(encoding="utf-8").splitlines()]
+    assert len(lines) == len(messages)
+    for line, message in zip(lines, messages, strict=True):
+        assert line.startswith(line_prefix)
+        assert line.endswith(message)
+    for path in files:
+        size = path.stat().st_size
+        assert size > 0
+        # A file only exceeds the maximum size with a single record that does not fit any file
+        assert size < MAX_BYTES or len(path.read_text(encoding="utf-8").splitlines()) == 1
+
+
+def _handler(filepath: Path, *, delay: bool, io_uring: bool = False) -> logging.Handler:
+    from src.utils._file_handlers import _FastRotatingFileHandler, _IoUringRotatingFileHandler, io_uring_available
+    if io_uring and not io_uring_available():
+        pytest.skip("io_uring is not available")
+    handler_class = _IoUringRotatingFileHandler if io_uring else _FastRotatingFileHandler
+    handler = handler_class(
+        filepath, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT, encoding="utf-8", delay=delay,
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    return handler
+
+
+@pytest.mark.parametrize("io_uring", [False, True])
+@pytest.mark.parametrize("batch_size", [1, 7, 1000])
+@pytest.mark.parametrize("delay", [False, True])
+def test_rotation_across_batches(tmp_path: Path, delay: bool, batch_size: int, io_uring: bool):
+    filepath = tmp_path / "vrp.log"
+    messages = _messages(120)
+    records = _records(messages)
+    handler = _handler(filepath, delay=delay, io_uring=io_uring)
+    for k in range(0, len(records), batch_size):
+        handler.handle_batch(records[k:k + batch_size])
+    handler.close()
+    assert len(_log_files(filepath)) > 10
+    _check_rotated(filepath, messages)
+
+
+@pytest.mark.parametrize("delay", [False, True])
+def test_rotation_record_by_record(tmp_path: Path, delay: bool):
+    filepath = tmp_path / "vrp.log"
+    messages = _messages(120)
+    handler = _handler(filepath, delay=delay)
+    for record in _records(messages):
+        handler.handle(record)
+    handler.close()
+    _check_rotated(filepath, messages)
+
+
+def test_filter_replacing_records(tmp_path: Path):
+    filepath = tmp_path / "vrp.log"
+    handler = _handler(filepath, delay=True)
+
+    def replace(record: logging.LogRecord) -> logging.LogRecord | bool:
+        if "drop" in record.msg:
+            return False
+        return logging.makeLogRecord({**record.__dict__, "msg": record.msg.upper()})
+
+    handler.addFilter(replace)
+    records = _records(["keep one", "drop two", "keep three"])
+    handler.handle_batch(records)
+    handler.close()
+    assert filepath.read_text(encoding="utf-8").splitlines() == ["KEEP ONE", "KEEP THREE"]
+    assert [record.msg for record in records] == ["keep one", "drop two", "keep three"]
+
+
+def test_rotation_through_the_batch_listener(tmp_path: Path):
+    from src.utils.logger import Logger
+    filepath = tmp_path / "logs" / "vrp.log"
+    messages = _messages(60)
+    logger = Logger(
+        "test_rotation_through_the_batch_listener", console_output=False, file_output=str(filepath),
+        max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT,
+    )
+    for message in messages:
+        logger.info(message)
+    logger.close()
+    assert len(_log_files(filepath)) > 10
+    _check_rotated(filepath, messages, line_prefix="20")
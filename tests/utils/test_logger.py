@@ -0,0 +1,172 @@
+from datetime import datetime
+
+import pytest
+
+DATE_FORMATS = [
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%H:%M:%S.%f %z",
+    "%f",
+    "%f%f",
+    "%%f",
+    "%%%f",
+    "%%%%f",
+    "100%%f at %S.%f%Z",
+]
+SECOND = 1_700_000_000
+CREATED = [
+    SECOND,
+    SECOND + 0.5,
+    SECOND + 0.123456,
+    SECOND + 0.9999994,
+    SECOND + 0.9999996,
+    SECOND + 1.0000004,
+    SECOND + 0.25,
+    SECOND + 59.9999996,
+    SECOND - 0.0000004,
+]
+
+
+@pytest.mark.parametrize("date_format", DATE_FORMATS)
+def test_format_timestamp(date_format: str):
+    from src.utils.logger import JsonFormatter
+    formatter = JsonFormatter(date_format)
+    # The seconds repeat out of order, so that the parts cached for a second are reused and replaced
+    for created in CREATED + CREATED[::-1]:
+        assert formatter.format_timestamp(created) == datetime.fromtimestamp(created).strftime(date_format)
+
+
+def _record(message: str, *args, extra_fields: dict | None = None, exc_info: bool = False):
+    import logging
+    import sys
+    record_exc_info = None
+    if exc_info:
+        try:
+            raise ValueError("bad value \"é\"\n")
+        except ValueError:
+            record_exc_info = sys.exc_info()
+    record = logging.LogRecord(
+        name="vrp.test", level=logging.WARNING, pathname=__file__, lineno=42,
+        msg=message, args=args, exc_info=record_exc_info, func="solve",
+    )
+    record.created = SECOND + 0.123456
+    if extra_fields is not None:
+        record.extra_fields = extra_fields
+    return record
+
+
+def _baseline_json(record, date_format: str) -> str:
+    import json
+    import logging
+    log_data = {
+        "timestamp": datetime.fromtimestamp(record.created).strftime(date_format),
+        "level": record.levelname,
+        "logger": record.name,
+        "message": record.getMessage(),
+        "module": record.module,
+        "function": record.funcName,
+        "line": record.lineno,
+    }
+    if record.exc_info:
+        log_data["exception"] = logging.Formatter().formatException(record.exc_info)
+    if hasattr(record, "extra_fields"):
+        log_data.update(record.extra_fields)
+    return json.dumps(log_data)
+
+
+def _stdlib_formatter(date_format: str):
+    from src.utils.logger import JsonFormatter
+    return JsonFormatter(date_format, fast_json=False)
+
+
+RECORDS = [
+    ("plain message", (), {}),
+    ("quotes \" and backslashes \\ and control \x00\x1f\t\n characters", (), {}),
+    ("non-ASCII éß中 and surrogate pairs \U0001f600\U00010348", (), {}),
+    ("lone surrogate \ud800 and %s with %d", ("args é", 3), {}),
+    ("with extra fields", (), {"extra_fields": {"user_id": 123, "name": "é\U0001f600", "ratio": 0.5}}),
+    ("with empty extra fields", (), {"extra_fields": {}}),
+    ("extra overrides a reserved key", (), {"extra_fields": {"level": "OVERRIDDEN", "zeta": [1, None]}}),
+    ("extra overrides the exception", (), {"extra_fields": {"exception": "none"}, "exc_info": True}),
+    ("with exception", (), {"exc_info": True}),
+    ("with exception and extra fields", (), {"extra_fields": {"request": "abc"}, "exc_info": True}),
+]
+
+
+@pytest.mark.parametrize("date_format", ["%Y-%m-%d %H:%M:%S", "%H:%M:%S.%f"])
+@pytest.mark.parametrize(("message", "args", "kwargs"), RECORDS)
+def test_json_format_matches_json_dumps(message: str, args: tuple, kwargs: dict, date_format: str):
+    formatter = _stdlib_formatter(date_format)
+    expected = _baseline_json(_record(message, *args, **kwargs), date_format)
+    assert formatter.format(_record(message, *args, **kwargs)) == expected
+    assert formatter.format_bytes(_record(message, *args, **kwargs)) == expected.encode("utf-8")
+
+
+@pytest.mark.parametrize("fast_json", [False, True])
+@pytest.mark.parametrize(("message", "args", "kwargs"), RECORDS)
+def test_json_format_with_and_without_fast_path(message: str, args: tuple, kwargs: dict, fast_json: bool):
+    import json
+    from src.utils.logger import JsonFormatter
+    if fast_json:
+        pytest.importorskip("orjson")
+    formatter = JsonFormatter("%Y-%m-%d %H:%M:%S", fast_json=fast_json)
+    expected = _baseline_json(_record(message, *args, **kwargs), "%Y-%m-%d %H:%M:%S")
+    formatted = formatter.format(_record(message, *args, **kwargs))
+    formatted_bytes = formatter.format_bytes(_record(message, *args, **kwargs))
+    if fast_json:
+        # The same fields and values, in compact JSON
+        assert json.loads(formatted) == json.loads(expected)
+        assert json.loads(formatted_bytes) == json.loads(expected)
+    else:
+        assert formatted == expected
+        assert formatted_bytes == expected.encode("utf-8")
+
+
+@pytest.mark.parametrize("fast_json", [False, True])
+@pytest.mark.parametrize("extra_fields", [{1: "int key"}, {"big": 10**30}, {"key": "lone surrogate \ud800"}])
+def test_json_format_falls_back_to_json_dumps(extra_fields: dict, fast_json: bool):
+    from src.utils.logger import JsonFormatter
+    if fast_json:
+        pytest.importorskip("orjson")
+    # Fields orjson rejects are serialised by the standard json module
+    formatter = JsonFormatter("%Y-%m-%d %H:%M:%S", fast_json=fast_json)
+    expected = _baseline_json(_record("message", extra_fields=extra_fields), "%Y-%m-%d %H:%M:%S")
+    assert formatter.format(_record("message", extra_fields=extra_fields)) == expected
+    assert formatter.format_bytes(_record("message", extra_fields=extra_fields)) == expected.encode("utf-8")
+
+
+def test_json_format_of_nan_with_orjson():
+    import json
+    from src.utils.logger import JsonFormatter
+    pytest.importorskip("orjson")
+    record = _record("message", extra_fields={"ratio": float("nan")})
+    assert json.loads(JsonFormatter("%Y", fast_json=True).format(record))["ratio"] is None
+    record = _record("message", extra_fields={"ratio": float("nan")})
+    assert JsonFormatter("%Y", fast_json=False).format(record).endswith('"ratio": NaN}')
+
+
+def test_logger_without_fast_json(tmp_path):
+    from src.utils.logger import Logger
+    filepath = tmp_path / "vrp.log"
+    logger = Logger("test_logger_without_fast_json", console_output=False, file_output=str(filepath),
+                    json_format=True, fast_json=False)
+    with logger.add_context(user="é"):
+        logger.info("message")
+    logger.close()
+    assert '"message": "message", ' in filepath.read_text(encoding="utf-8")
+    assert '"user": "\\u00e9"}' in filepath.read_text(encoding="utf-8")
+
+
+@pytest.mark.parametrize("date_format", [None, "%Y-%m-%d %H:%M:%S", "%H:%M:%S %z"])
+def test_text_format_time(date_format: str | None):
+    import logging
+    from src.utils.logger import TextFormatter
+    fmt = "%(asctime)s - %(name)s - %(message)s"
+    formatter = TextFormatter(fmt, date_format)
+    stock_formatter = logging.Formatter(fmt, datefmt=date_format)
+    for created in CREATED + CREATED[::-1]:
+        record = _record("message")
+        record.created = created
+        record.msecs = int((created - int(created)) * 1000) + 0.0
+        assert formatter.formatTime(record, date_format) == stock_formatter.formatTime(record, date_format)
+        assert formatter.format(record) == stock_formatter.format(record)